@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""Measures codecs encoding and decoding cost against payload types
+
+Every available codec is ran over a set of payloads, from small dicts
+to large binary buffers. Codecs not supporting a payload type are
+reported as such. Large buffers are wrapped in a PickleBuffer when
+pickle protocol 5 is available, so they are sent out-of-band.
+
+usage: python benchmarks/serialization_cost.py [--repeat N] [--size MB]
+"""
+import os
+import sys
+import time
+import pickle
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pkit.serialization import CODECS, encode_message, decode_message
+
+
+def payloads(size):
+    blob = bytearray(b'a' * size)
+    large = blob
+    if pickle.HIGHEST_PROTOCOL >= 5:
+        large = pickle.PickleBuffer(blob)
+
+    return [
+        ('small dict', {'id': 1234, 'name': 'abc', 'scores': [1.5, 2.5]}),
+        ('int list', list(range(100000))),
+        ('str list', ['record {0}'.format(i) for i in range(10000)]),
+        ('bytes', bytes(blob)),
+        ('large buffer', large),
+    ]
+
+
+def measure(codec, payload, repeat):
+    encode_time = decode_time = 0
+    size = 0
+
+    for _ in range(repeat):
+        start = time.time()
+        chunks = encode_message(codec, payload)
+        encode_time += time.time() - start
+
+        data = bytearray(b''.join(memoryview(c).tobytes() for c in chunks))
+        size = len(data)
+
+        start = time.time()
+        decode_message(codec, data)
+        decode_time += time.time() - start
+
+    return encode_time / repeat, decode_time / repeat, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--size', type=int, default=16,
+                        help='binary payloads size, in megabytes')
+    args = parser.parse_args()
+
+    codecs = []
+    for name in sorted(CODECS):
+        try:
+            codecs.append(CODECS[name]())
+        except RuntimeError as e:
+            print('{0}: skipped, {1}'.format(name, e))
+
+    print('{0:<14}{1:<9}{2:>12}{3:>12}{4:>14}'.format(
+        'payload', 'codec', 'encode ms', 'decode ms', 'size'))
+
+    for payload_name, payload in payloads(args.size * 1024 * 1024):
+        for codec in codecs:
+            try:
+                encode_time, decode_time, size = measure(codec, payload, args.repeat)
+            except (TypeError, ValueError):
+                print('{0:<14}{1:<9}{2:>12}'.format(
+                    payload_name, codec.name, 'unsupported'))
+                continue
+
+            print('{0:<14}{1:<9}{2:>12.3f}{3:>12.3f}{4:>14}'.format(
+                payload_name, codec.name,
+                encode_time * 1000, decode_time * 1000, size))
+
+
+if __name__ == '__main__':
+    main()
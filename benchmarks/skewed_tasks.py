@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""Measures ProcessPool latency over a skewed task-duration distribution
+
+A small share of long tasks is mixed with many short ones. The benchmark
+reports how long submitters were blocked waiting for a slot, and the
+overall makespan, which are both driven by how fast a freed slot gets
+reused.
+
+usage: python benchmarks/skewed_tasks.py [--slots N] [--tasks N]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from pkit.pool import ProcessPool
+
+
+def percentile(values, p):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def durations(count, long_ratio, short, long, seed=42):
+    rand = random.Random(seed)
+    return [long if rand.random() < long_ratio else short
+            for _ in range(count)]
+
+
+def run(slots, tasks, long_ratio, short, long):
+    pool = ProcessPool(slots)
+    waits = []
+
+    start = time.time()
+    for duration in durations(tasks, long_ratio, short, long):
+        before = time.time()
+        pool.execute(target=time.sleep, args=(duration,))
+        waits.append(time.time() - before)
+
+    pool.run()
+    makespan = time.time() - start
+
+    return waits, makespan
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--slots', type=int, default=4)
+    parser.add_argument('--tasks', type=int, default=200)
+    parser.add_argument('--long-ratio', type=float, default=0.05)
+    parser.add_argument('--short', type=float, default=0.005)
+    parser.add_argument('--long', type=float, default=0.25)
+    args = parser.parse_args()
+
+    waits, makespan = run(args.slots, args.tasks, args.long_ratio,
+                          args.short, args.long)
+
+    print('tasks={0} slots={1} makespan={2:.3f}s'.format(
+        args.tasks, args.slots, makespan))
+    for p in (50, 90, 99, 100):
+        print('slot wait p{0}: {1:.4f}s'.format(p, percentile(waits, p)))
+
+
+if __name__ == '__main__':
+    main()
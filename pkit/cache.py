@@ -0,0 +1,161 @@
+import time
+import pickle
+import sqlite3
+import hashlib
+import collections
+
+
+def task_key(target, args=(), kwargs={}):
+    """Builds a task cache key out of a target and it's arguments
+
+    The key is made of the target qualified name, and a stable hash
+    of the pickled arguments, so it remains valid across restarts.
+
+    :param  target: callable object to be invoked in the run method
+    :type   target: callable
+
+    :param  args: arguments to provide to the target
+    :type   args: tuple
+
+    :param  kwargs: keyword arguments to provide to the target
+    :type   kwargs: dict
+
+    :returns: the task cache key
+    :rtype: str
+    """
+    name = getattr(target, '__qualname__', None) or target.__name__
+    if '<' in name:
+        raise ValueError(
+            "Cannot build a cache key for anonymous or local "
+            "target {0}".format(name)
+        )
+
+    payload = pickle.dumps((tuple(args), sorted(kwargs.items())), 2)
+    digest = hashlib.sha1(payload).hexdigest()
+
+    return '{0}.{1}:{2}'.format(target.__module__, name, digest)
+
+
+class SqliteStore(object):
+    """Disk backed task cache store, survives restarts
+
+    :param  path: path to the sqlite database file
+    :type   path: str
+    """
+    def __init__(self, path):
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS task_cache ("
+            "key TEXT PRIMARY KEY, value BLOB, expires REAL)"
+        )
+        self._connection.commit()
+
+    def get(self, key):
+        """Retrieves a stored (value, expires) pair, or None"""
+        row = self._connection.execute(
+            "SELECT value, expires FROM task_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        return pickle.loads(bytes(row[0])), row[1]
+
+    def set(self, key, value, expires=None):
+        self._connection.execute(
+            "INSERT OR REPLACE INTO task_cache VALUES (?, ?, ?)",
+            (key, sqlite3.Binary(pickle.dumps(value, 2)), expires)
+        )
+        self._connection.commit()
+
+    def delete(self, key):
+        self._connection.execute(
+            "DELETE FROM task_cache WHERE key = ?", (key,)
+        )
+        self._connection.commit()
+
+    def clear(self):
+        self._connection.execute("DELETE FROM task_cache")
+        self._connection.commit()
+
+    def close(self):
+        self._connection.close()
+
+
+class TaskCache(object):
+    """Least recently used cache of finished tasks results
+
+    Entries are evicted once the cache holds more than maxsize of
+    them, least recently used first, or as soon as they are older than
+    the provided ttl.
+
+    :param  maxsize: maximum number of entries held in memory
+    :type   maxsize: int
+
+    :param  ttl: entries time to live in seconds, None means forever
+    :type   ttl: float
+
+    :param  store: optional persistent second tier, looked up on
+                   memory misses and written through on updates.
+    :type   store: pkit.cache.SqliteStore
+    """
+    def __init__(self, maxsize=1024, ttl=None, store=None):
+        if maxsize < 1:
+            raise ValueError("Cache maxsize has to be a positive integer")
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.store = store
+        self._entries = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def get(self, key, default=None):
+        """Retrieves a cached value, refreshing it's recency
+
+        :returns: the cached value, or default if missing or expired
+        """
+        entry = self._entries.pop(key, None)
+        if entry is None and self.store is not None:
+            entry = self.store.get(key)
+
+        if entry is None:
+            return default
+
+        value, expires = entry
+        if expires is not None and expires <= time.time():
+            self.delete(key)
+            return default
+
+        self._insert(key, entry)
+        return value
+
+    def set(self, key, value):
+        expires = time.time() + self.ttl if self.ttl is not None else None
+        self._entries.pop(key, None)
+        self._insert(key, (value, expires))
+
+        if self.store is not None:
+            self.store.set(key, value, expires)
+
+    def delete(self, key):
+        self._entries.pop(key, None)
+
+        if self.store is not None:
+            self.store.delete(key)
+
+    def clear(self):
+        self._entries.clear()
+
+        if self.store is not None:
+            self.store.clear()
+
+    def _insert(self, key, entry):
+        self._entries[key] = entry
+
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
@@ -0,0 +1,202 @@
+import time
+import heapq
+
+from pkit.pool import Task
+
+
+class TaskGraph(object):
+    """Dependent tasks executed through a ProcessPool
+
+    Tasks are added along with the tasks they depend on, and are
+    dispatched to the pool as soon as all of them have successfully
+    finished, so independent branches of the graph run in parallel.
+
+    When more tasks are ready than there are free slots, the ones
+    heading the longest remaining chain of work, the graph critical
+    path, are dispatched first. A failing task cancels every task
+    depending on it, directly or not; other branches keep running.
+
+    :param  pool: pool to run the tasks through
+    :type   pool: pkit.pool.ProcessPool
+    """
+    def __init__(self, pool):
+        self.pool = pool
+        self.tasks = []
+        self._nodes = {}
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def add(self, target, args=(), kwargs={}, depends_on=(), cost=1,
+            timeout=None):
+        """Adds a task to the graph
+
+        Dependencies have to be added first, which keeps the graph
+        free of cycles.
+
+        :param  target: callable object to be invoked in the run method
+        :type   target: callable
+
+        :param  args: arguments to provide to the target
+        :type   args: tuple
+
+        :param  kwargs: keyword arguments to provide to the target
+        :type   kwargs: dict
+
+        :param  depends_on: tasks which have to succeed before this one
+                            is started
+        :type   depends_on: list of pkit.pool.Task
+
+        :param  cost: estimated task duration, in any unit consistent
+                      across the graph, used to find it's critical path.
+        :type   cost: float
+
+        :param  timeout: task timeout, see ProcessPool.execute
+        :type   timeout: float
+
+        :returns: the added task, ready until dispatched
+        :rtype: pkit.pool.Task
+        """
+        for upstream in depends_on:
+            if not upstream in self._nodes:
+                raise ValueError(
+                    "Task {0} does not belong to the graph".format(upstream)
+                )
+
+        task = Task(None)
+        self._nodes[task] = {
+            'index': len(self.tasks),
+            'target': target,
+            'args': args,
+            'kwargs': kwargs,
+            'timeout': timeout,
+            'cost': cost,
+            'upstream': list(set(depends_on)),
+            'downstream': [],
+        }
+        for upstream in self._nodes[task]['upstream']:
+            self._nodes[upstream]['downstream'].append(task)
+
+        self.tasks.append(task)
+
+        return task
+
+    def priorities(self):
+        """Computes every task priority
+
+        A task priority is the cost of the most expensive chain of tasks
+        starting with it, itself included.
+
+        :returns: tasks priorities
+        :rtype: dict
+        """
+        priorities = {}
+
+        # Tasks are added after their dependencies: walking them
+        # backwards visits every task after it's dependents.
+        for task in reversed(self.tasks):
+            node = self._nodes[task]
+            priorities[task] = node['cost'] + max(
+                [priorities[d] for d in node['downstream']] or [0]
+            )
+
+        return priorities
+
+    def critical_path(self):
+        """Lists the most expensive chain of dependent tasks
+
+        :rtype: list of pkit.pool.Task
+        """
+        priorities = self.priorities()
+        roots = [t for t in self.tasks if not self._nodes[t]['upstream']]
+        if not roots:
+            return []
+
+        path = [max(roots, key=priorities.get)]
+        while self._nodes[path[-1]]['downstream']:
+            path.append(max(self._nodes[path[-1]]['downstream'], key=priorities.get))
+
+        return path
+
+    def run(self, timeout=None):
+        """Runs the graph tasks until they are all done
+
+        :param  timeout: time to wait for the graph to complete, forever
+                         if None. Tasks still running once it is reached
+                         are left running.
+        :type   timeout: float
+
+        :returns: tasks exit codes, keyed by task id. Cancelled tasks,
+                  and tasks not done before the deadline, have a None
+                  exitcode.
+        :rtype: dict
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        priorities = self.priorities()
+
+        pending = dict(
+            (task, len(self._nodes[task]['upstream']))
+            for task in self.tasks if task.status == Task.READY
+        )
+        ready = [
+            (-priorities[task], index, task)
+            for index, task in enumerate(self.tasks)
+            if pending.get(task) == 0
+        ]
+        heapq.heapify(ready)
+        running = []
+
+        while ready or running:
+            while ready and self.pool.slots.free > 0:
+                _, _, task = heapq.heappop(ready)
+                node = self._nodes[task]
+                self.pool._run_task(
+                    task,
+                    node['target'],
+                    node['args'],
+                    node['kwargs'],
+                    node['timeout']
+                )
+                running.append(task)
+
+            done = [task for task in running if task.finished]
+            for task in done:
+                running.remove(task)
+
+                if task.exitcode != 0:
+                    self._cancel_downstream(task)
+                    continue
+
+                for downstream in self._nodes[task]['downstream']:
+                    if not downstream in pending:
+                        continue
+
+                    pending[downstream] -= 1
+                    if pending[downstream] == 0 and downstream.status == Task.READY:
+                        heapq.heappush(ready, (
+                            -priorities[downstream],
+                            self._nodes[downstream]['index'],
+                            downstream
+                        ))
+
+            if done or not running:
+                continue
+
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+
+            self.pool.poll_events(remaining)
+
+        return dict((task.id, task.exitcode) for task in self.tasks)
+
+    def _cancel_downstream(self, task):
+        stack = list(self._nodes[task]['downstream'])
+
+        while stack:
+            downstream = stack.pop()
+            if downstream.status == Task.READY:
+                downstream.status = Task.CANCELLED
+                stack.extend(self._nodes[downstream]['downstream'])
@@ -0,0 +1,123 @@
+import array
+import collections
+
+
+TaskRecord = collections.namedtuple('TaskRecord', [
+    'id',
+    'exitcode',
+    'started_at',
+    'finished_at',
+    'utime',
+    'stime',
+    'maxrss',
+])
+
+
+class TaskHistory(object):
+    """Bounded ring buffer of finished tasks records
+
+    Records are stored column-wise into preallocated arrays of machine
+    values, rather than as one python object per task: the history
+    memory footprint is fixed at construction, however many tasks go
+    through it. Once full, the oldest records are overwritten first.
+
+    Resources usage columns come from the task process rusage, and are
+    None when it is unknown.
+
+    :param  maxlen: how many finished tasks records to keep
+    :type   maxlen: int
+    """
+    # Unset values markers, arrays cannot hold None
+    _NO_EXITCODE = -(2 ** 31)
+    _NO_MAXRSS = -1
+
+    def __init__(self, maxlen=100000):
+        if maxlen < 1:
+            raise ValueError("History maxlen has to be a positive integer")
+
+        self.maxlen = maxlen
+        self._ids = array.array('l', [0]) * maxlen
+        self._exitcodes = array.array('i', [self._NO_EXITCODE]) * maxlen
+        self._started_at = array.array('d', [0.0]) * maxlen
+        self._finished_at = array.array('d', [0.0]) * maxlen
+        self._utimes = array.array('d', [0.0]) * maxlen
+        self._stimes = array.array('d', [0.0]) * maxlen
+        self._maxrss = array.array('l', [self._NO_MAXRSS]) * maxlen
+
+        self._next = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        """Iterates over the records, oldest first"""
+        start = (self._next - self._size) % self.maxlen
+
+        for offset in range(self._size):
+            yield self._record((start + offset) % self.maxlen)
+
+    def record(self, task):
+        """Appends a finished task record
+
+        :param  task: finished task
+        :type   task: pkit.pool.Task
+        """
+        index = self._next
+
+        self._ids[index] = task.id
+        self._exitcodes[index] = (
+            self._NO_EXITCODE if task.exitcode is None else task.exitcode
+        )
+        self._started_at[index] = task.started_at or 0.0
+        self._finished_at[index] = task.finished_at or 0.0
+
+        rusage = task.rusage
+        if rusage is not None:
+            self._utimes[index] = rusage.ru_utime
+            self._stimes[index] = rusage.ru_stime
+            self._maxrss[index] = rusage.ru_maxrss
+        else:
+            self._maxrss[index] = self._NO_MAXRSS
+
+        self._next = (index + 1) % self.maxlen
+        self._size = min(self._size + 1, self.maxlen)
+
+    def get(self, task_id):
+        """Retrieves a task record by id
+
+        :returns: the task record, None if unknown or overwritten
+        :rtype: pkit.history.TaskRecord
+        """
+        # Unused slots hold a 0 id, which is never given to a task
+        if not self._size or not task_id:
+            return None
+
+        try:
+            index = self._ids.index(task_id)
+        except ValueError:
+            return None
+
+        return self._record(index)
+
+    def clear(self):
+        self._next = 0
+        self._size = 0
+
+        for index in range(self.maxlen):
+            self._ids[index] = 0
+
+    def _record(self, index):
+        exitcode = self._exitcodes[index]
+        maxrss = self._maxrss[index]
+        has_rusage = maxrss != self._NO_MAXRSS
+
+        return TaskRecord(
+            id=self._ids[index],
+            exitcode=None if exitcode == self._NO_EXITCODE else exitcode,
+            started_at=self._started_at[index] or None,
+            finished_at=self._finished_at[index] or None,
+            utime=self._utimes[index] if has_rusage else None,
+            stime=self._stimes[index] if has_rusage else None,
+            maxrss=maxrss if has_rusage else None,
+        )
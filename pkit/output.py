@@ -0,0 +1,188 @@
+import os
+import errno
+import select
+import threading
+import collections
+
+
+# Module globals. The output reader is shared by every capturing
+# Process of the current interpreter, see get_output_reader.
+_reader = None
+_reader_lock = threading.Lock()
+
+
+def get_output_reader():
+    """Retrieves or create the process-wide output reader
+
+    A forked child does not inherit it's parent reader thread, a new
+    reader is therefore created if the current one belongs to another
+    process.
+
+    :returns: the current process output reader
+    :rtype: pkit.output.OutputReader
+    """
+    global _reader
+
+    with _reader_lock:
+        if _reader is None or _reader.pid != os.getpid():
+            _reader = OutputReader()
+
+    return _reader
+
+
+class OutputStream(object):
+    """Bounded ring buffer of the lines read from a child output pipe
+
+    :param  name: stream name, either 'stdout' or 'stderr'
+    :type   name: str
+
+    :param  maxlines: how many lines to keep, oldest are dropped first
+    :type   maxlines: int
+
+    :param  callback: invoked from the reader thread with every
+                      complete line read from the stream.
+                      Should be of the form: lambda line: ...
+    :type   callback: callable
+    """
+    # A child writing without ever sending a newline should not grow
+    # the partial line forever, it is flushed as a line past this size.
+    MAX_LINE_LENGTH = 64 * 1024
+
+    def __init__(self, name, maxlines=1000, callback=None):
+        self.name = name
+        self.callback = callback
+        self.lines = collections.deque(maxlen=maxlines)
+
+        self._partial = b''
+        self._closed = threading.Event()
+
+    def __str__(self):
+        return '<OutputStream {0} {1} lines>'.format(self.name, len(self.lines))
+
+    @property
+    def closed(self):
+        return self._closed.is_set()
+
+    def feed(self, data):
+        """Splits incoming data into lines, ran by the reader thread"""
+        chunks = (self._partial + data).split(b'\n')
+        self._partial = chunks.pop()
+
+        if len(self._partial) > self.MAX_LINE_LENGTH:
+            chunks.append(self._partial)
+            self._partial = b''
+
+        for line in chunks:
+            self._push(line)
+
+    def close(self):
+        """Flushes the pending partial line and marks the stream closed"""
+        if self._partial:
+            self._push(self._partial)
+            self._partial = b''
+
+        self._closed.set()
+
+    def wait(self, timeout=None):
+        """Blocks until the child end of the stream is closed
+
+        :returns: whether the stream has been closed
+        :rtype: bool
+        """
+        self._closed.wait(timeout)
+        return self.closed
+
+    def _push(self, line):
+        self.lines.append(line)
+
+        if self.callback is not None:
+            self.callback(line)
+
+
+class OutputReader(object):
+    """Drains children output pipes from a single background thread
+
+    Every registered pipe is multiplexed through one poll object, so
+    children never block on a full pipe buffer, whatever their number.
+    The thread is started on first registration and stops as soon as
+    there is no pipe left to read from.
+
+    :param  chunk_size: how many bytes to read at once from a pipe
+    :type   chunk_size: int
+    """
+    def __init__(self, chunk_size=64 * 1024):
+        self.pid = os.getpid()
+        self.chunk_size = chunk_size
+
+        self._streams = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+        # Self pipe used to wake the reader up on registrations
+        self._wakeup_read, self._wakeup_write = os.pipe()
+
+    def register(self, fd, stream):
+        """Starts draining fd into the provided stream
+
+        :param  fd: read end of a child output pipe, owned by the reader
+                    from now on and closed on EOF.
+        :type   fd: int
+
+        :param  stream: stream to feed the read data to
+        :type   stream: pkit.output.OutputStream
+
+        :returns: the provided stream
+        :rtype: pkit.output.OutputStream
+        """
+        with self._lock:
+            self._streams[fd] = stream
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+            else:
+                os.write(self._wakeup_write, b'\0')
+
+        return stream
+
+    def _run(self):
+        poller = select.poll()
+        poller.register(self._wakeup_read, select.POLLIN)
+        polled = set()
+
+        while True:
+            with self._lock:
+                if not self._streams:
+                    self._thread = None
+                    return
+
+                for fd in set(self._streams) - polled:
+                    poller.register(fd, select.POLLIN)
+                    polled.add(fd)
+
+            try:
+                events = poller.poll()
+            except (select.error, OSError) as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+
+            for fd, _ in events:
+                if fd == self._wakeup_read:
+                    os.read(self._wakeup_read, self.chunk_size)
+                    continue
+
+                data = os.read(fd, self.chunk_size)
+                stream = self._streams[fd]
+
+                if data:
+                    stream.feed(data)
+                    continue
+
+                poller.unregister(fd)
+                polled.discard(fd)
+                with self._lock:
+                    del self._streams[fd]
+                os.close(fd)
+                stream.close()
@@ -0,0 +1,291 @@
+import time
+import errno
+import types
+import multiprocessing
+
+try:
+    from queue import Empty
+except ImportError:
+    from Queue import Empty
+
+from pkit.process import Process
+
+
+class EndOfStream(object):
+    """Marks the end of the records flowing through a channel"""
+
+
+class Stage(object):
+    """Pipeline step, ran by a fixed number of worker processes
+
+    :param  target: callable invoked with every record of the stage
+                    input, it's return value is passed down to the next
+                    stage. None drops the record, and a generator passes
+                    down every record it yields.
+    :type   target: callable
+
+    :param  workers: how many processes run the stage
+    :type   workers: int
+
+    :param  name: stage name, the target name if not provided
+    :type   name: str
+    """
+    def __init__(self, target, workers=1, name=None):
+        if workers < 1:
+            raise ValueError("Stage workers has to be a positive integer")
+
+        self.target = target
+        self.workers = workers
+        self.name = name or getattr(target, '__name__', 'stage')
+
+        self.input = None
+        self.output = None
+        self.processes = []
+        self.started_at = None
+        self.finished_at = None
+
+        self._processed = multiprocessing.Value('l', 0)
+        self._exited = multiprocessing.Value('i', 0)
+        self._next_workers = 1
+
+    @property
+    def processed(self):
+        """How many input records the stage went through"""
+        return self._processed.value
+
+    @property
+    def throughput(self):
+        """Processed records per second since the stage started"""
+        if self.started_at is None:
+            return 0.0
+
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return self.processed / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def queue_depth(self):
+        """How many records are waiting in the stage input channel"""
+        return self.input.qsize() if self.input is not None else 0
+
+    def work(self):
+        """Worker process loop, ran in the stage children"""
+        while True:
+            record = self.input.get()
+            if isinstance(record, EndOfStream):
+                break
+
+            result = self.target(record)
+            if isinstance(result, types.GeneratorType):
+                for item in result:
+                    self.output.put(item)
+            elif result is not None:
+                self.output.put(result)
+
+            with self._processed.get_lock():
+                self._processed.value += 1
+
+        # The last worker out closes the next stage input, once per
+        # next stage worker.
+        with self._exited.get_lock():
+            self._exited.value += 1
+            last = self._exited.value == self.workers
+
+        if last:
+            for _ in range(self._next_workers):
+                self.output.put(EndOfStream())
+
+        # Records are pushed to the pipe by a feeder thread, which
+        # has to be flushed before the child exits.
+        self.output.close()
+        self.output.join_thread()
+
+
+class Pipeline(object):
+    """Chain of stages streaming records through bounded channels
+
+    Each stage reads records from it's own channel, and writes the
+    records it produces straight into the next stage one: data never
+    goes through the parent, which only feeds the first stage and
+    collects the last one output.
+
+    Channels are bounded multiprocessing queues, a stage producing
+    faster than the next one consumes blocks once the channel is full,
+    and so on up to the pipeline input.
+
+    :param  stages: pipeline stages, in processing order
+    :type   stages: list of pkit.pipeline.Stage
+
+    :param  maxsize: how many records each channel can hold
+    :type   maxsize: int
+    """
+    def __init__(self, stages, maxsize=1000):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+
+        self.stages = list(stages)
+        self.maxsize = maxsize
+        self.running = False
+
+        self.crashed = []
+        self._input = None
+        self._output = None
+        self._ended = False
+
+    def start(self):
+        """Creates the channels, and starts every stage workers"""
+        channels = [multiprocessing.Queue(self.maxsize)
+                    for _ in range(len(self.stages) + 1)]
+        self._input, self._output = channels[0], channels[-1]
+
+        for index, stage in enumerate(self.stages):
+            stage.input = channels[index]
+            stage.output = channels[index + 1]
+            if index + 1 < len(self.stages):
+                stage._next_workers = self.stages[index + 1].workers
+
+        now = time.time()
+        for stage in self.stages:
+            stage.started_at = now
+            stage.processes = [
+                Process(
+                    target=stage.work,
+                    name='{0}-{1}'.format(stage.name, index),
+                    on_exit=self._on_worker_exit,
+                )
+                for index in range(stage.workers)
+            ]
+            for process in stage.processes:
+                process.start()
+
+        self.running = True
+        self._ended = False
+
+    def put(self, record, timeout=None):
+        """Feeds a record to the first stage
+
+        Blocks while the first stage channel is full.
+
+        :raises: Full if the channel is still full after timeout
+        """
+        self._input.put(record, True, timeout)
+
+    def close(self):
+        """Signals the first stage there are no more records coming"""
+        for _ in range(self.stages[0].workers):
+            self._input.put(EndOfStream())
+
+    def get(self, timeout=None):
+        """Retrieves a record out of the last stage
+
+        :param  timeout: time to wait for a record, forever if None
+        :type   timeout: float
+
+        :returns: the next output record, or an EndOfStream instance
+                  once every stage has gone through all it's input.
+        :raises: Empty if no record was produced before timeout,
+                 RuntimeError if a stage worker crashed.
+        """
+        if self._ended is True:
+            return EndOfStream()
+
+        deadline = time.time() + timeout if timeout is not None else None
+
+        while True:
+            if self.crashed:
+                raise RuntimeError(
+                    "Pipeline workers crashed: {0}".format(self.crashed)
+                )
+
+            wait = 0.05
+            if deadline is not None:
+                wait = min(wait, max(deadline - time.time(), 0))
+
+            try:
+                record = self._output.get(True, wait)
+            except Empty:
+                if deadline is not None and time.time() >= deadline:
+                    raise
+                continue
+            except IOError as e:
+                if e.errno != errno.EINTR:
+                    raise
+                continue
+
+            if isinstance(record, EndOfStream):
+                self._ended = True
+
+            return record
+
+    def __iter__(self):
+        """Yields the last stage output records until the end of stream"""
+        while True:
+            record = self.get()
+            if isinstance(record, EndOfStream):
+                return
+            yield record
+
+    def join(self, timeout=None):
+        """Waits for every stage workers to exit
+
+        :returns: whether they all exited before timeout
+        :rtype: bool
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        delay = 0.0005
+
+        while self.running is True:
+            delay = min(delay * 2, 0.05)
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                delay = min(delay, remaining)
+
+            time.sleep(delay)
+
+        return True
+
+    def terminate(self):
+        """Stops every stage workers
+
+        Records still buffered for the first stage are dropped.
+        """
+        if self._input is not None:
+            self._input.cancel_join_thread()
+
+        for stage in self.stages:
+            for process in stage.processes:
+                if process.is_alive:
+                    process.terminate()
+
+    def stats(self):
+        """Per stage statistics
+
+        :returns: name, workers count, processed records, throughput
+                  in records per second and input queue depth of
+                  every stage.
+        :rtype: list of dict
+        """
+        return [
+            {
+                'name': stage.name,
+                'workers': stage.workers,
+                'processed': stage.processed,
+                'throughput': stage.throughput,
+                'queue_depth': stage.queue_depth,
+            }
+            for stage in self.stages
+        ]
+
+    def _on_worker_exit(self, process):
+        if process.exitcode != 0:
+            self.crashed.append(process.name)
+
+        for stage in self.stages:
+            if any(p is process for p in stage.processes):
+                if all(p.pid is None or p is process for p in stage.processes):
+                    stage.finished_at = time.time()
+
+        if all(p.pid is None or p is process
+               for stage in self.stages for p in stage.processes):
+            self.running = False
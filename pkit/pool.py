@@ -1,38 +1,80 @@
 import os
-import uuid
+import time
+import errno
 import copy
+import heapq
 import signal
-
-from pkit.process import Process
+import itertools
+import collections
+
+from pkit.cache import TaskCache, task_key
+from pkit.history import TaskHistory
+from pkit.output import get_output_reader
+from pkit.process import Process, JOIN_RESTART_POLICY, TERMINATE_RESTART_POLICY
+from pkit.serialization import MessageStream, get_codec, write_message
 from pkit.slot import SlotPool
+from pkit.wakeup import Wakeup
+
+
+# Module globals. Tasks ids are drawn from a process-wide counter,
+# so they are unique across pools and cheap to store.
+_task_ids = itertools.count(1)
 
 
 class Task(object):
     """Tracks a ProcessPool execution
-    
+
+    Tasks are slotted objects, pools running millions of them should
+    only pay for the few attributes they hold.
+
     :param  process_pid: process execution pid to track
     :type   process_pid: int
 
     :param  _id: specify explictly the task id, if not provided
-                 a random one will be generated.
-    :type   _id: string
+                 the next one of a process-wide counter is used.
+    :type   _id: int
 
     :param  status: task execution status
     :type   status: member of Task.STATUSES
     """
+    __slots__ = (
+        'id',
+        'pid',
+        'exitcode',
+        'rusage',
+        'started_at',
+        'finished_at',
+        'timed_out',
+        '_status',
+        '_process',
+        '_cache_key',
+        '_result',
+    )
+
     READY = 'ready'
     RUNNING = 'running'
     FINISHED = 'finished'
+    CANCELLED = 'cancelled'
 
     STATUSES = (
         READY,
         RUNNING,
-        FINISHED
+        FINISHED,
+        CANCELLED
     )
 
     def __init__(self, process_pid, _id=None, status=None):
-        self.id = _id or uuid.uuid4().hex 
+        self.id = _id or next(_task_ids)
+        self.pid = process_pid
         self.exitcode = None
+        self.rusage = None
+        self.started_at = None
+        self.finished_at = None
+        self.timed_out = False
+        self._status = Task.READY
+        self._process = None
+        self._cache_key = None
+        self._result = None
 
         if status:
             self.status = status
@@ -45,9 +87,6 @@ class Task(object):
 
     @property
     def status(self):
-        if not hasattr(self, '_status'):
-            self._status = Task.READY
-
         return self._status
 
     @status.setter
@@ -64,6 +103,80 @@ class Task(object):
     def finished(self):
         return self.status == Task.FINISHED
 
+    @property
+    def cancelled(self):
+        return self.status == Task.CANCELLED
+
+    def result(self, timeout=None):
+        """Retrieves the task target return value
+
+        Blocks until the task process has exited and it's result has
+        been read. Tasks whose target failed, or which did not run, such
+        as cancelled tasks and tasks served from the pool cache, have a
+        None result.
+
+        :param  timeout: time to wait for the result, forever if None
+        :type   timeout: float
+
+        :raises: RuntimeError if the result is not available after timeout
+        """
+        stream = self._result
+        if stream is None:
+            return None
+
+        if not stream.wait(timeout):
+            raise RuntimeError("Task {0} result is not available yet".format(self.id))
+
+        return stream.decode()
+
+
+class TaskProcess(Process):
+    """Process sending it's target return value back to it's parent
+
+    The return value is encoded by the provided codec, and written to a
+    pipe drained by the process-wide output reader. Targets returning
+    None do not write anything.
+
+    :param  codec: codec to encode the target return value with
+    :type   codec: codec, see pkit.serialization
+    """
+    def __init__(self, codec, *args, **kwargs):
+        super(TaskProcess, self).__init__(*args, **kwargs)
+        self.codec = codec
+        self.result = None
+        self._result_pipe = None
+
+    def start(self, wait=False, wait_timeout=0):
+        read_fd, write_fd = os.pipe()
+        self._result_pipe = (read_fd, write_fd)
+
+        try:
+            child_pid = super(TaskProcess, self).start(wait, wait_timeout)
+        except:
+            os.close(read_fd)
+            raise
+        finally:
+            os.close(write_fd)
+
+        self.result = get_output_reader().register(
+            read_fd,
+            MessageStream(self.codec)
+        )
+
+        return child_pid
+
+    def run(self):
+        read_fd, write_fd = self._result_pipe
+        os.close(read_fd)
+
+        result = None
+        if self.target:
+            result = self.target(*self.target_args, **self.target_kwargs)
+
+        if result is not None:
+            write_message(write_fd, self.codec, result)
+        os.close(write_fd)
+
 
 class ProcessPool(object):
     """Bounded parrallel execution pool through processes
@@ -72,26 +185,89 @@ class ProcessPool(object):
     as it will block as soon as there are no available slots
     for supplied execution request.
 
+    Tasks exits are only queued by the SIGCHLD handler. They are
+    handled in batches, along with timeouts and recycling, by the pool
+    event loop: poll_events, ran whenever the pool waits for a slot or
+    for tasks, and by run. Tasks statuses and slots are therefore only
+    updated from normal context.
+
     :param  slots: how many parrallel executions can be
                    done at the same time.
     :type   slots: int
+
+    :param  cache: finished tasks cache used by cached executions,
+                   a default in-memory one is created on first use
+                   if not provided.
+    :type   cache: pkit.cache.TaskCache
+
+    :param  process_group: whether to run the tasks, and their own
+                           children, in a process group dedicated to
+                           the pool. The whole pool can then be signaled
+                           through a single killpg call.
+    :type   process_group: bool
+
+    :param  max_rss_per_worker: resident memory, in bytes, above which
+                                a running task is recycled. See recycle.
+    :type   max_rss_per_worker: int
+
+    :param  recycle_interval: minimum time in seconds between two memory
+                              checks made while waiting for a slot.
+    :type   recycle_interval: float
+
+    :param  history: finished tasks records buffer. The pool does not
+                     keep finished tasks around, without a history they
+                     are only known to the caller.
+    :type   history: pkit.history.TaskHistory
+
+    :param  timeout_grace: time given to timed out tasks to handle
+                           SIGTERM before being sent a SIGKILL.
+    :type   timeout_grace: float
+
+    :param  codec: codec tasks return values are sent back with, either
+                   a name out of pkit.serialization.CODECS or a codec
+                   instance.
+    :type   codec: str or codec
     """
-    def __init__(self, slots=None):
+    def __init__(self, slots=None, cache=None, process_group=False,
+                 max_rss_per_worker=None, recycle_interval=1, history=None,
+                 timeout_grace=1, codec='pickle'):
         # If slots is None, the slots pool will
         # automatically set it's size to the host
         # cpu count.
         self.slots = SlotPool(slots)
         self.processes = {}
+        self.cache = cache
+        self.process_group = process_group
+        self.pgid = None
+        self.max_rss_per_worker = max_rss_per_worker
+        self.recycle_interval = recycle_interval
+        self.history = history
+        self.timeout_grace = timeout_grace
+        self.codec = get_codec(codec)
         self._tasks = {}
+        self._deadlines = []
+        self._inflight = {}
+        self._retiring = set()
+        self._recycled_at = 0
+
+        # Exited children pids, queued from the SIGCHLD handler
+        self._exits = collections.deque()
+        self._wakeup = Wakeup()
 
         self.ready = True
 
-    def execute(self, target, args=(), kwargs={}):
+    def execute(self, target, args=(), kwargs={}, cache=False, timeout=None,
+                codec=None):
         """Adds a task execution to the pool
 
         Will block until a slot is available if none is available
         at the moment.
 
+        Cached executions are meant for deterministic targets: an
+        execution identical to a running one returns the running task,
+        and one identical to an already successful one returns a
+        finished task right away, without forking.
+
         :param  target: callable object to be invoked in the run method
         :type   target: callable
 
@@ -100,50 +276,412 @@ class ProcessPool(object):
 
         :param  kwargs: keyword arguments to provide to the target
         :type   kwargs: dict
+
+        :param  cache: whether to serve the execution from the pool cache
+        :type   cache: bool
+
+        :param  timeout: time in seconds the task is allowed to run for,
+                         it is sent a SIGTERM once overdue, and a SIGKILL
+                         if still running timeout_grace seconds later.
+                         See check_timeouts.
+        :type   timeout: float
+
+        :param  codec: codec to send the task return value back with,
+                       the pool one if not provided. See Task.result.
+        :type   codec: str or codec
         """
         if not self.ready is True:
             return
 
-        # Unix semaphores are acquired through sem_post and sem_wait
-        # syscalls, which can potentially fail. an OSError is then raised.
-        self.slots.acquire()
-        process = Process(
+        cache_key = None
+        if cache is True:
+            cache_key = task_key(target, args, kwargs)
+            if cache_key in self._inflight:
+                return self._inflight[cache_key]
+
+            if self.cache is None:
+                self.cache = TaskCache()
+
+            exitcode = self.cache.get(cache_key)
+            if exitcode is not None:
+                task = Task(None, status=Task.FINISHED)
+                task.exitcode = exitcode
+                return task
+
+        task = Task(None)
+        task._cache_key = cache_key
+        self._run_task(task, target, args, kwargs, timeout, codec)
+
+        return task
+
+    def _run_task(self, task, target, args=(), kwargs={}, timeout=None,
+                  codec=None):
+        """Runs a ready task, blocking until a slot is available"""
+        codec = self.codec if codec is None else get_codec(codec)
+
+        self._acquire_slot()
+        task.started_at = time.time()
+        process, process_pid = self._start_process(target, args, kwargs, codec)
+
+        task.pid = process_pid
+        task.status = Task.RUNNING
+        task._process = process
+        task._result = process.result
+
+        self._tasks[process_pid] = task
+        if task._cache_key is not None:
+            self._inflight[task._cache_key] = task
+
+        if timeout is not None:
+            self._schedule_deadline(task.started_at + timeout, task, signal.SIGTERM)
+
+    def poll_events(self, timeout=0):
+        """Runs one iteration of the pool event loop
+
+        Waits until a task exits, a timeout is due, or the recycle
+        interval has elapsed, then handles every pending event at once:
+        queued exits are processed, their slots released and their tasks
+        finished, overdue tasks are signaled, and leaking ones recycled.
+
+        :param  timeout: maximum time to wait for an event if none is
+                         pending, forever if None.
+        :type   timeout: float
+
+        :returns: how many task exits were handled
+        :rtype: int
+        """
+        if not self._exits:
+            self._wakeup.wait(self._next_timer_in(timeout))
+
+        handled = 0
+        while self._exits:
+            self.on_process_exit(self._exits.popleft())
+            handled += 1
+
+        self.check_timeouts()
+        if (self.max_rss_per_worker is not None and
+                time.time() - self._recycled_at >= self.recycle_interval):
+            self.recycle()
+
+        return handled
+
+    def run(self, timeout=None):
+        """Runs the pool event loop until no task is running
+
+        :param  timeout: time to run the loop for, forever if None
+        :type   timeout: float
+
+        :returns: whether every task finished before timeout
+        :rtype: bool
+        """
+        return self._wait_tasks(list(self._tasks.values()), timeout)
+
+    def _on_sigchld_exit(self, pid):
+        # Ran from the SIGCHLD handler: only queue the exit for the
+        # event loop, appending to a deque is atomic.
+        self._exits.append(pid)
+        self._wakeup.notify()
+
+    def _next_timer_in(self, timeout):
+        """Shortens a wait timeout so it ends at the next timer"""
+        timers = []
+        if self._deadlines:
+            timers.append(self._deadlines[0][0])
+        if self.max_rss_per_worker is not None:
+            timers.append(self._recycled_at + self.recycle_interval)
+
+        if timers:
+            due_in = max(min(timers) - time.time(), 0)
+            timeout = due_in if timeout is None else min(timeout, due_in)
+
+        return timeout
+
+    def check_timeouts(self):
+        """Signals the tasks which ran past their timeout
+
+        Deadlines are kept in a single heap, so checking them only
+        costs a peek at it's head until one is actually due. Finished
+        tasks entries are discarded lazily. The pool checks timeouts
+        while waiting for slots or tasks, long running callers doing
+        neither should call it periodically.
+
+        :returns: the tasks sent a SIGTERM by this call
+        :rtype: list
+        """
+        expired = []
+        now = time.time()
+
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, _, task, signum = heapq.heappop(self._deadlines)
+            process = task._process
+            if task.finished or process is None:
+                continue
+
+            task.timed_out = True
+            self._kill([process], signum)
+
+            if signum == signal.SIGTERM:
+                expired.append(task)
+                self._schedule_deadline(now + self.timeout_grace, task, signal.SIGKILL)
+
+        return expired
+
+    def _schedule_deadline(self, deadline, task, signum):
+        heapq.heappush(self._deadlines, (deadline, task.id, task, signum))
+
+        # Finished tasks entries are only dropped once due: rebuild
+        # the heap when they outnumber the running tasks ones.
+        if len(self._deadlines) > 2 * len(self._tasks) + 64:
+            self._deadlines = [
+                entry for entry in self._deadlines
+                if not entry[2].finished
+            ]
+            heapq.heapify(self._deadlines)
+
+    def _start_process(self, target, args, kwargs, codec):
+        # The first task leads the pool process group, the
+        # following ones join it.
+        process_group = None
+        if self.process_group is True:
+            process_group = self.pgid or 0
+
+        process = TaskProcess(
+            codec,
             target=target,
             args=args,
             kwargs=kwargs,
-            on_exit=lambda p: self.on_process_exit(p.pid),
+            on_exit=lambda p: self._on_sigchld_exit(p.pid),
+            process_group=process_group,
         )
 
         process_pid = process.start(wait=True)
-        task = Task(process_pid, status=Task.RUNNING)
+        if process.pgid is not None:
+            self.pgid = process.pgid
 
-        self._tasks[process_pid] = {
-            'task': task,
-            'process': process
-        }
+        return process, process_pid
 
-        return task
+    def recycle(self, policy=TERMINATE_RESTART_POLICY):
+        """Replaces the tasks whose memory grew past max_rss_per_worker
+
+        Meant for long lived worker targets leaking memory, which can
+        safely be started over. Every task is ran in it's own fresh
+        process, so memory can only pile up within a single long task.
+
+        A replacement process running the same target is started first,
+        and takes over the task and it's slot, so the pool capacity never
+        drops. The leaking process is then retired following the provided
+        restart policy: TERMINATE_RESTART_POLICY sends it a SIGTERM,
+        JOIN_RESTART_POLICY lets it exit on it's own.
+
+        :param  policy: how to retire the leaking processes
+        :type   policy: int
+
+        :returns: the recycled tasks
+        :rtype: list
+        """
+        if not policy in [JOIN_RESTART_POLICY, TERMINATE_RESTART_POLICY]:
+            raise ValueError("Invalid restart policy supplied")
+
+        self._recycled_at = time.time()
+        if self.max_rss_per_worker is None:
+            return []
+
+        recycled = []
+        for pid, task in list(self._tasks.items()):
+            rss = task._process.rss
+            if rss is not None and rss > self.max_rss_per_worker:
+                if self._recycle_process(pid, policy):
+                    recycled.append(task)
+
+        return recycled
+
+    def _recycle_process(self, pid, policy):
+        # Marked as retiring before being unregistered: if it exits in
+        # between, it's slot is kept for the replacement.
+        self._retiring.add(pid)
+        task = self._tasks.pop(pid, None)
+        if task is None:
+            self._retiring.discard(pid)
+            return False
+
+        retiring = task._process
+        process, process_pid = self._start_process(
+            retiring.target,
+            retiring.target_args,
+            retiring.target_kwargs,
+            retiring.codec
+        )
+        task.pid = process_pid
+        task._process = process
+        task._result = process.result
+        self._tasks[process_pid] = task
+
+        if policy == TERMINATE_RESTART_POLICY:
+            self._kill([retiring], signal.SIGTERM)
+
+        return True
+
+    def _acquire_slot(self):
+        """Blocks until a slot is available
+
+        Slots are released by the event loop, so it is ran until one
+        is, rather than blocking on the semaphore.
+        """
+        # Unix semaphores are acquired through sem_post and sem_wait
+        # syscalls, which can potentially fail. an OSError is then raised.
+        while not self.slots.acquire(blocking=False):
+            self.poll_events(timeout=None)
 
     def close(self, timeout=None):
+        """Waits for the running tasks to finish
+
+        Every task is awaited at once against a single deadline, so
+        closing the pool takes at most timeout whatever it's size.
+
+        :param  timeout: time to wait for the tasks to finish, forever
+                         if None.
+        :type   timeout: float
+
+        :returns: running tasks exit codes, keyed by task id. Tasks still
+                  running once the deadline is reached have a None exitcode.
+        :rtype: dict
+        """
         self.ready = False
-        processes_to_join = [task['process'] for (pid,task) in
-                             self._tasks.items()]
+        tasks = list(self._tasks.values())
 
-        for process in processes_to_join:
-            process.join(timeout=timeout)
+        self._wait_tasks(tasks, timeout)
 
-    def terminate(self, wait=False):
+        return dict((task.id, task.exitcode) for task in tasks)
+
+    def terminate(self, wait=False, grace=1):
+        """Stops the running tasks
+
+        Every task is sent a SIGTERM in one pass. When waiting, tasks
+        still running after the grace period are sent a SIGKILL, and
+        awaited for one more grace period, so terminating the pool takes
+        at most twice the grace period whatever it's size.
+
+        :param  wait: whether to wait for the tasks to exit
+        :type   wait: bool
+
+        :param  grace: time given to the tasks to handle SIGTERM
+        :type   grace: float
+
+        :returns: running tasks exit codes, keyed by task id
+        :rtype: dict
+        """
         self.ready = False
-        processes_to_stop = [task['process'] for (pid,task) in
-                             self._tasks.items()]
+        tasks = list(self._tasks.values())
+
+        self.send_signal(signal.SIGTERM)
 
-        for process in processes_to_stop:
-            process.terminate(wait=wait)
+        if wait is True and not self._wait_tasks(tasks, grace):
+            self.send_signal(signal.SIGKILL)
+            self._wait_tasks(tasks, grace)
+
+        return dict((task.id, task.exitcode) for task in tasks)
+
+    def pause(self):
+        """Stops every running task through SIGSTOP"""
+        self.send_signal(signal.SIGSTOP)
+
+    def resume(self):
+        """Resumes every paused task through SIGCONT"""
+        self.send_signal(signal.SIGCONT)
+
+    def send_signal(self, signum):
+        """Sends signum to every running task
+
+        When the pool runs it's tasks in a dedicated process group,
+        the signal is sent to the whole group, tasks descendants
+        included, in a single killpg call.
+
+        :param  signum: signal to send
+        :type   signum: int
+        """
+        if self.pgid is not None:
+            try:
+                os.killpg(self.pgid, signum)
+            except OSError as e:
+                if e.errno != errno.ESRCH:
+                    raise
+            return
+
+        self._kill([task._process for task in self._tasks.values()], signum)
+
+    def _kill(self, processes, signum):
+        """Sends signum to every still running process"""
+        for process in processes:
+            pid = process.pid
+            if pid is None:
+                continue
+
+            try:
+                os.kill(pid, signum)
+            except OSError as e:
+                if e.errno != errno.ESRCH:
+                    raise
+
+    def _wait_tasks(self, tasks, timeout=None):
+        """Waits for every provided task to finish
+
+        The event loop is ran until they have, or until a single
+        deadline.
+
+        :returns: whether every task has finished before the deadline
+        :rtype: bool
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+
+        # Pending exits are handled first, tasks which already
+        # exited should not count as running.
+        self.poll_events(timeout=0)
+
+        pending = [task for task in tasks if not task.finished]
+        while pending:
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+
+            if self.poll_events(remaining):
+                pending = [task for task in pending if not task.finished]
+
+        return True
 
     def on_process_exit(self, pid):
+        """Handles a task process exit, ran by the event loop"""
+        # Recycled processes slot has been handed to their replacement
+        if pid in self._retiring:
+            self._retiring.discard(pid)
+            return
+
         self.slots.release()
 
         if pid in self._tasks:
-            self._tasks[pid]['task'].status = Task.FINISHED
-            self._tasks[pid]['task'].exitcode = self._tasks[pid]['process'].exitcode
-            del self._tasks[pid]
+            self._finish_task(self._tasks.pop(pid))
+
+    def _finish_task(self, task):
+        process = task._process
+        task.status = Task.FINISHED
+        task.exitcode = process.exitcode
+        task.rusage = process.rusage
+        task.finished_at = time.time()
+
+        # Finished tasks may be held by the caller for long, they
+        # should not keep their process around.
+        task._process = None
+
+        cache_key = task._cache_key
+        task._cache_key = None
+
+        if self.history is not None:
+            self.history.record(task)
+
+        if cache_key is not None:
+            self._inflight.pop(cache_key, None)
+
+            # Only successful executions are worth serving again
+            if task.exitcode == 0:
+                self.cache.set(cache_key, task.exitcode)
@@ -2,15 +2,45 @@ import sys
 import os
 import time
 import errno
+import struct
 import signal
 import select
 import traceback
 
 from multiprocessing.forking import Popen
 
+from pkit.output import OutputStream, get_output_reader
+
 JOIN_RESTART_POLICY = 0
 TERMINATE_RESTART_POLICY = 1
 
+# Module globals. Children registry maps every running child pid
+# to the Process object which started it. SIGCHLD is delivered once
+# per parent process, not per child, so it has to be routed from here
+# to the Process instance actually owning the exited child.
+_children = {}
+
+
+def on_sigchld(signum, sigframe):
+    """Process-wide SIGCHLD handler, dispatches the signal to every
+    registered Process so each one can reap it's own child."""
+    for process in list(_children.values()):
+        process.on_sigchld(signum, sigframe)
+
+
+def decode_status(status):
+    """Translates a waitpid status into a returncode
+
+    :returns: the child exit status, or the negated signal number
+              if the child was killed by a signal.
+    :rtype: int
+    """
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+
+    assert os.WIFEXITED(status)
+    return os.WEXITSTATUS(status)
+
 
 def get_current_process():
     class CurrentProcess(Process):
@@ -40,25 +70,52 @@ class ProcessOpen(object):
 
     :param  process: Process whom create method should be called in the child process
     :type   process: pkit.process.Process
+
+    :param  ready_fd: write end of a pipe shared by several children,
+                      which the child writes it's pid to once ready,
+                      instead of using a pipe of it's own. Readiness is
+                      then awaited by the caller, see start_many.
+    :type   ready_fd: int
     """
     READY_FLAG = "READY"
+    READY_PID = struct.Struct('!I')
 
-    def __init__(self, process, wait=False, wait_timeout=1):
+    def __init__(self, process, wait=False, wait_timeout=1, ready_fd=None):
         sys.stdout.flush()
         sys.stderr.flush()
         self.process = process
         self.returncode = None
+        self.rusage = None
 
         self.ready = None
-        read_pipe, write_pipe = os.pipe()
+        read_pipe = write_pipe = None
+        if wait is True and ready_fd is None:
+            read_pipe, write_pipe = os.pipe()
+
+        output_pipes = None
+        if getattr(process, 'capture_output', False) is True:
+            output_pipes = (os.pipe(), os.pipe())
+
+        self.pgid = None
+        process_group = getattr(process, 'process_group', None)
 
         self.pid = os.fork()
         if self.pid == 0:
+            # Siblings are not the child's children
+            _children.clear()
+            if process_group is not None:
+                self._set_process_group(0, process_group)
+
             signal.signal(signal.SIGTERM, self.on_sigterm)
 
+            if output_pipes is not None:
+                self._redirect_output(output_pipes)
+
             # Once the child process has it's signal handler
             # binded we warn the parent process through a pipe
-            if wait is True:
+            if ready_fd is not None:
+                self._send_ready_pid(ready_fd)
+            elif wait is True:
                 self._send_ready_flag(write_pipe, read_pipe)
 
             returncode = self.process.create()
@@ -66,8 +123,60 @@ class ProcessOpen(object):
             sys.stderr.flush()
             os._exit(returncode)
         else:
-            if wait is True:
+            if process_group is not None:
+                self.pgid = self._set_process_group(self.pid, process_group)
+
+            if output_pipes is not None:
+                self._capture_output(output_pipes)
+
+            if read_pipe is not None:
                 self.ready = self._poll_ready_flag(read_pipe, write_pipe, wait_timeout)
+                os.close(read_pipe)
+
+    def _set_process_group(self, pid, pgid):
+        """Moves the child into the pgid process group
+
+        Ran on both sides of the fork, so the child is in it's group
+        whichever of the parent or the child runs first. A child asked
+        to join a group which does not exist anymore leads a new one.
+
+        :param  pid: child pid, or 0 from the child itself
+        :type   pid: int
+
+        :param  pgid: process group id to join, 0 to lead a new group
+        :type   pgid: int
+
+        :returns: the child process group id
+        :rtype: int
+        """
+        try:
+            os.setpgid(pid, pgid)
+        except OSError as e:
+            if e.errno == errno.EPERM and pgid != 0:
+                return self._set_process_group(pid, 0)
+            # The child has already exited
+            if e.errno not in (errno.ESRCH, errno.EACCES):
+                raise
+
+        return pgid or self.pid or os.getpid()
+
+    def _redirect_output(self, output_pipes):
+        """Ran in the forked child process, plugs stdout and stderr
+        file descriptors onto the write ends of the output pipes"""
+        for (read_pipe, write_pipe), fd in zip(output_pipes, (1, 2)):
+            os.close(read_pipe)
+            os.dup2(write_pipe, fd)
+            os.close(write_pipe)
+
+    def _capture_output(self, output_pipes):
+        """Hands the read ends of the output pipes over to the
+        output reader, and exposes their streams on the process"""
+        reader = get_output_reader()
+
+        for (read_pipe, write_pipe), name in zip(output_pipes, ('stdout', 'stderr')):
+            os.close(write_pipe)
+            stream = self.process._create_output_stream(name)
+            setattr(self.process, name, reader.register(read_pipe, stream))
 
     def _send_ready_flag(self, write_pipe, read_pipe=None):
         """Ran in the forked child process"""
@@ -78,6 +187,12 @@ class ProcessOpen(object):
         write_pipe.write(self.READY_FLAG)
         write_pipe.close()
 
+    def _send_ready_pid(self, ready_fd):
+        """Ran in the forked child process, writes are atomic as long
+        as they are smaller than PIPE_BUF, siblings cannot interleave"""
+        os.write(ready_fd, self.READY_PID.pack(os.getpid()))
+        os.close(ready_fd)
+
     def _poll_ready_flag(self, read_pipe, write_pipe=None, timeout=0):
         """Polls the child process read-only pipe for incoming data"""
         if write_pipe is not None:
@@ -97,7 +212,7 @@ class ProcessOpen(object):
         if self.returncode is None:
             while True:
                 try:
-                    pid, sts = os.waitpid(self.pid, flag)
+                    pid, sts, rusage = os.wait4(self.pid, flag)
                 except os.error as e:
                     if e.errno == errno.EINTR:
                         continue
@@ -107,11 +222,8 @@ class ProcessOpen(object):
                 else:
                     break
             if pid == self.pid:
-                if os.WIFSIGNALED(sts):
-                    self.returncode = -os.WTERMSIG(sts)
-                else:
-                    assert os.WIFEXITED(sts)
-                    self.returncode = os.WEXITSTATUS(sts)
+                self.returncode = decode_status(sts)
+                self.rusage = rusage
 
         return self.returncode
 
@@ -217,15 +329,45 @@ class Process(object):
 
     :param  kwargs: keyword arguments to provide to the target
     :type   kwargs: dict
+
+    :param  capture_output: connects the child stdout and stderr to pipes
+                            drained by the output reader, instead of
+                            the inherited ones. Read lines are kept in
+                            the process stdout and stderr streams.
+    :type   capture_output: bool
+
+    :param  on_output: callback to be invoked, from the output reader
+                       thread, with every captured line. Should be of
+                       the form: lambda process, stream_name, line: ...
+    :type   on_output: callable
+
+    :param  output_maxlines: how many lines each captured stream keeps
+    :type   output_maxlines: int
+
+    :param  process_group: process group the child is moved into, so it
+                           and it's descendants can be signaled at once.
+                           0 makes the child lead a new group, None keeps
+                           it in the parent's one.
+    :type   process_group: int
     """
     def __init__(self, target=None, name=None,
-                 parent=False, on_exit=None, args=(), kwargs={}):
+                 parent=False, on_exit=None, args=(), kwargs={},
+                 capture_output=False, on_output=None, output_maxlines=1000,
+                 process_group=None):
         self._current = get_current_process()
         self._parent_pid = self._current.pid
         self._child = None
         self._parent = None
         self._exitcode = None
+        self._rusage = None
         self._on_exit = on_exit
+        self._on_output = on_output
+
+        self.capture_output = capture_output
+        self.output_maxlines = output_maxlines
+        self.process_group = process_group
+        self.stdout = None
+        self.stderr = None
 
         self.name = name or self.__class__.__name__
         self.daemonic = False
@@ -234,7 +376,7 @@ class Process(object):
         self.target_kwargs = dict(kwargs)
 
         # Bind signals handlers
-        signal.signal(signal.SIGCHLD, self.on_sigchld)
+        signal.signal(signal.SIGCHLD, on_sigchld)
         signal.siginterrupt(signal.SIGCHLD, False)
 
     def __str__(self):
@@ -244,15 +386,48 @@ class Process(object):
         return self.__str__()
 
     def on_sigchld(self, signum, sigframe):
-        if self._child is not None and self._child.pid:
-            pid, status = os.waitpid(self._child.pid, os.WNOHANG)
-            if pid == self._child.pid:
-                self._exitcode = os.WEXITSTATUS(status)
+        """Reaps the process child if it has exited
+
+        Exit callback and cleanup routine are only ran once the
+        child is actually gone, running siblings are left untouched.
+        """
+        # Signal handlers may run between any two statements, and clean
+        # the child up from under our feet: work on a local reference.
+        child = self._child
+        if child is None or not child.pid:
+            return
+
+        try:
+            pid, status, rusage = os.wait4(child.pid, os.WNOHANG)
+        except OSError as e:
+            if e.errno != errno.ECHILD:
+                raise
+            # Child was already reaped, through join for example.
+            # If it's returncode is not known yet, the reaping is
+            # still in progress and will run the exit routine.
+            if child.returncode is None:
+                return
+            pid, status, rusage = child.pid, None, None
+
+        if pid != child.pid:
+            return
+
+        if status is not None:
+            child.returncode = decode_status(status)
+            child.rusage = rusage
+
+        # Unregistering is atomic regarding signal handlers, it
+        # ensures the exit routine is only ran once per child.
+        if _children.pop(child.pid, None) is None:
+            return
+
+        self._exitcode = child.returncode
+        self._rusage = child.rusage
 
-            if self._on_exit:
-                self._on_exit(self)
+        if self._on_exit:
+            self._on_exit(self)
 
-            self.clean()
+        self.clean()
 
     def create(self):
         """Method to be called when the process child is forked"""
@@ -288,10 +463,18 @@ class Process(object):
 
         return returncode
 
+    def _create_output_stream(self, name):
+        callback = None
+        if self._on_output is not None:
+            callback = lambda line: self._on_output(self, name, line)
+
+        return OutputStream(name, self.output_maxlines, callback)
+
     def clean(self):
         """Cleans up the object child process status"""
         self._current = get_current_process()
         if self._child is not None:
+            _children.pop(self._child.pid, None)
             self._child = None
 
     def run(self):
@@ -301,6 +484,9 @@ class Process(object):
 
     def start(self, wait=False, wait_timeout=0):
         """Starts the Process"""
+        return self._start(wait, wait_timeout)
+
+    def _start(self, wait=False, wait_timeout=0, ready_fd=None):
         if os.getpid() != self._parent_pid:
             raise RuntimeError(
                 "Can only start a process object created by current process"
@@ -308,9 +494,19 @@ class Process(object):
         if self._child is not None:
             raise RuntimeError("Cannot start a process twice")
 
-        self._child = ProcessOpen(self, wait=wait, wait_timeout=wait_timeout)
+        self._child = ProcessOpen(
+            self,
+            wait=wait,
+            wait_timeout=wait_timeout,
+            ready_fd=ready_fd
+        )
         child_pid = self._child.pid
         self._current = self
+        _children[child_pid] = self
+
+        # The child might have exited before being registered, in which
+        # case it's SIGCHLD was already delivered and has to be replayed.
+        self.on_sigchld(signal.SIGCHLD, None)
 
         return child_pid
 
@@ -323,8 +519,10 @@ class Process(object):
         if self._child is None:
             raise RuntimeError("Can only join a started process")
 
+        child = self._child
         try:
-            self._exitcode = self._child.wait(timeout)
+            self._exitcode = child.wait(timeout)
+            self._rusage = child.rusage
         except OSError:
             pass
 
@@ -344,15 +542,20 @@ class Process(object):
             self.wait(until=lambda p, *args: p._child is None)
 
     def restart(self, policy=JOIN_RESTART_POLICY):
+        """Restarts the process once it's current child has exited
+
+        :param  policy: JOIN_RESTART_POLICY waits for the child to exit,
+                        TERMINATE_RESTART_POLICY forces it to stop.
+        :type   policy: int
+        """
         if not policy in [JOIN_RESTART_POLICY, TERMINATE_RESTART_POLICY]:
             raise ValueError("Invalid restart policy supplied")
 
         if policy == JOIN_RESTART_POLICY:
             self.join()
-        elif policy == TERMINTE_RESTART_POLICY:
-            pid_dump = self.pid
-            self.terminate()
-            os.waitpid(pid_dump, 0)
+        elif policy == TERMINATE_RESTART_POLICY:
+            # The child is reaped by the SIGCHLD handler
+            self.terminate(wait=True)
 
         self.start()
 
@@ -444,3 +647,109 @@ class Process(object):
         if self._child is None:
             return None
         return self._child.pid
+
+    @property
+    def rss(self):
+        """Resident set size of the child in bytes, None if unknown"""
+        if self._child is None or not self._child.pid:
+            return None
+
+        try:
+            with open('/proc/{0}/statm'.format(self._child.pid)) as statm:
+                pages = int(statm.read().split()[1])
+        except (IOError, OSError, IndexError, ValueError):
+            return None
+
+        return pages * os.sysconf('SC_PAGE_SIZE')
+
+    @property
+    def rusage(self):
+        """Resources used by the last exited child, as returned by
+        os.wait4, None if unknown"""
+        return self._rusage
+
+    @property
+    def pgid(self):
+        """Process group id the child was moved into, if any"""
+        if self._child is None:
+            return None
+        return self._child.pgid
+
+
+def start_many(processes, wait=False, wait_timeout=1):
+    """Starts several processes, awaiting their readiness at once
+
+    Process.start(wait=True) forks a child and waits for it to be ready
+    before returning, so starting processes one by one costs a full
+    handshake each. Here, every child is forked first, and reports it's
+    readiness by writing it's pid to a single pipe shared by all of
+    them, which is then read until they all did, or until timeout.
+
+    :param  processes: processes to start
+    :type   processes: list of pkit.process.Process
+
+    :param  wait: whether to wait for the children to be ready
+    :type   wait: bool
+
+    :param  wait_timeout: maximum time to wait for all the children
+    :type   wait_timeout: float
+
+    :returns: the started children pids, in processes order
+    :rtype: list of int
+    """
+    if wait is False:
+        return [process.start() for process in processes]
+
+    read_fd, write_fd = os.pipe()
+    try:
+        pids = [process._start(True, wait_timeout, write_fd)
+                for process in processes]
+    finally:
+        os.close(write_fd)
+
+    try:
+        ready = _read_ready_pids(read_fd, set(pids), wait_timeout)
+    finally:
+        os.close(read_fd)
+
+    for process, pid in zip(processes, pids):
+        # Children which already exited have been cleaned up
+        child = process._child
+        if child is not None:
+            child.ready = pid in ready
+
+    return pids
+
+
+def _read_ready_pids(read_fd, pids, timeout):
+    """Reads the pids written by ready children, until every pid of
+    pids has been read, all the children closed the pipe, or timeout"""
+    size = ProcessOpen.READY_PID.size
+    deadline = time.time() + timeout
+    ready = set()
+    data = b''
+
+    while not pids <= ready:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+
+        try:
+            read, _, _ = select.select([read_fd], [], [], remaining)
+        except select.error as e:
+            if e.args[0] == errno.EINTR:
+                continue
+            raise
+        if not read:
+            break
+
+        chunk = os.read(read_fd, size * 512)
+        if not chunk:
+            break
+
+        data += chunk
+        for offset in range(0, len(data) - len(data) % size, size):
+            ready.add(ProcessOpen.READY_PID.unpack_from(data, offset)[0])
+        data = data[len(data) - len(data) % size:]
+
+    return ready
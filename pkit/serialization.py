@@ -0,0 +1,245 @@
+import os
+import errno
+import struct
+import threading
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class PickleCodec(object):
+    """Pickles objects, with out-of-band buffers where available
+
+    With pickle protocol 5, objects exposing their data through
+    PickleBuffer, such as numpy arrays or bytearrays wrapped in a
+    PickleBuffer, are not copied into the pickle stream: their memory
+    is handed over as separate buffers, written to the channel as is.
+    Older protocols serialize everything in-band.
+
+    :param  protocol: pickle protocol to use, the highest available
+                      one if not provided.
+    :type   protocol: int
+    """
+    name = 'pickle'
+
+    def __init__(self, protocol=None):
+        self.protocol = pickle.HIGHEST_PROTOCOL if protocol is None else protocol
+
+    def encode(self, obj):
+        """Serializes obj
+
+        :returns: the serialized payload, and the out-of-band buffers
+        :rtype: tuple of (bytes, list)
+        """
+        if self.protocol < 5:
+            return pickle.dumps(obj, self.protocol), []
+
+        buffers = []
+        payload = pickle.dumps(
+            obj,
+            self.protocol,
+            buffer_callback=lambda b: buffers.append(b.raw())
+        )
+
+        return payload, buffers
+
+    def decode(self, payload, buffers):
+        if self.protocol < 5:
+            return pickle.loads(payload)
+
+        return pickle.loads(payload, buffers=buffers)
+
+
+class MsgpackCodec(object):
+    """Serializes objects through msgpack
+
+    Only supports msgpack native types, but is cheaper than pickle on
+    small dicts, lists and scalars. Requires the msgpack package.
+    """
+    name = 'msgpack'
+
+    def __init__(self):
+        if msgpack is None:
+            raise RuntimeError("The msgpack codec requires the msgpack package")
+
+    def encode(self, obj):
+        return msgpack.packb(obj, use_bin_type=True), []
+
+    def decode(self, payload, buffers):
+        return msgpack.unpackb(payload, raw=False)
+
+
+class RawCodec(object):
+    """Passes bytes-like objects through as is
+
+    The object memory is written to the channel without being copied,
+    and read back as a memoryview. Any other type raises TypeError.
+    """
+    name = 'raw'
+
+    def encode(self, obj):
+        try:
+            return b'', [memoryview(obj)]
+        except TypeError:
+            raise TypeError(
+                "The raw codec only supports bytes-like objects, "
+                "got {0}".format(type(obj))
+            )
+
+    def decode(self, payload, buffers):
+        return buffers[0]
+
+
+CODECS = {
+    PickleCodec.name: PickleCodec,
+    MsgpackCodec.name: MsgpackCodec,
+    RawCodec.name: RawCodec,
+}
+
+
+def get_codec(codec):
+    """Retrieves a codec instance
+
+    :param  codec: codec name, member of CODECS, or codec instance
+    :type   codec: str or codec
+
+    :returns: the codec instance
+    """
+    if not isinstance(codec, str):
+        return codec
+
+    if not codec in CODECS:
+        raise ValueError("Unknown codec {0}".format(codec))
+
+    return CODECS[codec]()
+
+
+# Message frame header: payload size and buffers count, followed by
+# every buffer size.
+_HEADER = struct.Struct('!QI')
+_BUFFER_SIZE = struct.Struct('!Q')
+
+
+def _byte_view(buffer):
+    view = memoryview(buffer)
+
+    # Multi dimensional or wide items buffers are flattened to bytes,
+    # memoryviews can only be cast from python 3.3 onwards.
+    if hasattr(view, 'cast') and (view.ndim != 1 or view.itemsize != 1):
+        view = view.cast('B')
+
+    return view
+
+
+def encode_message(codec, obj):
+    """Frames an object encoded by codec
+
+    :returns: the chunks making up the message, out-of-band buffers
+              included as is rather than copied into a single string.
+    :rtype: list
+    """
+    payload, buffers = codec.encode(obj)
+    buffers = [_byte_view(buffer) for buffer in buffers]
+
+    header = _HEADER.pack(len(payload), len(buffers)) + b''.join(
+        _BUFFER_SIZE.pack(len(buffer)) for buffer in buffers
+    )
+
+    return [header, payload] + buffers
+
+
+def decode_message(codec, data):
+    """Decodes a message framed by encode_message
+
+    :param  data: the whole message
+    :type   data: bytearray
+    """
+    view = memoryview(data)
+    payload_size, count = _HEADER.unpack_from(data)
+    offset = _HEADER.size
+
+    sizes = []
+    for _ in range(count):
+        sizes.append(_BUFFER_SIZE.unpack_from(data, offset)[0])
+        offset += _BUFFER_SIZE.size
+
+    payload = view[offset:offset + payload_size].tobytes()
+    offset += payload_size
+
+    buffers = []
+    for size in sizes:
+        buffers.append(view[offset:offset + size])
+        offset += size
+
+    return codec.decode(payload, buffers)
+
+
+def write_message(fd, codec, obj):
+    """Writes obj to fd, without copying it's out-of-band buffers"""
+    for chunk in encode_message(codec, obj):
+        chunk = _byte_view(chunk)
+        while len(chunk):
+            try:
+                written = os.write(fd, chunk)
+            except OSError as e:
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            chunk = chunk[written:]
+
+
+class MessageStream(object):
+    """Collects a message read from a child pipe
+
+    Meant to be registered to the process-wide output reader, which
+    feeds it with the read data, and closes it on EOF. A child exiting
+    without writing anything leaves the stream empty.
+
+    :param  codec: codec the message was encoded with
+    """
+    def __init__(self, codec):
+        self.codec = codec
+        self.name = 'message'
+
+        self._data = bytearray()
+        self._closed = threading.Event()
+        self._decoded = False
+        self._value = None
+
+    @property
+    def closed(self):
+        return self._closed.is_set()
+
+    @property
+    def empty(self):
+        return not self._data
+
+    def feed(self, data):
+        self._data += data
+
+    def close(self):
+        self._closed.set()
+
+    def wait(self, timeout=None):
+        """Blocks until the child end of the pipe is closed
+
+        :returns: whether the stream has been closed
+        :rtype: bool
+        """
+        self._closed.wait(timeout)
+        return self.closed
+
+    def decode(self):
+        """Decodes the collected message, None if there is none"""
+        if not self._decoded and not self.empty:
+            self._value = decode_message(self.codec, self._data)
+            self._decoded = True
+
+        return self._value
@@ -17,9 +17,20 @@ class SlotPool(object):
         self.free = self.size
         self._semaphore = multiprocessing.Semaphore(self.size)
 
-    def acquire(self):
-        self._semaphore.acquire()
+    def acquire(self, blocking=True):
+        """Acquires a slot from the pool
+
+        :param  blocking: whether to block until a slot is available.
+        :type   blocking: bool
+
+        :returns: True if a slot was acquired, False otherwise
+        :rtype: bool
+        """
+        if not self._semaphore.acquire(blocking):
+            return False
+
         self.free -= 1
+        return True
 
     def release(self):
         if (self.free + 1) > self.size:
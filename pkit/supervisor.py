@@ -0,0 +1,207 @@
+import time
+import heapq
+import collections
+
+from pkit.wakeup import Wakeup
+
+
+ONE_FOR_ONE = 'one_for_one'
+ONE_FOR_ALL = 'one_for_all'
+
+STRATEGIES = (
+    ONE_FOR_ONE,
+    ONE_FOR_ALL
+)
+
+
+class Supervisor(object):
+    """Keeps a set of processes running by restarting them when they crash
+
+    A process crashes when it exits with a non-zero exitcode. Processes
+    exiting successfully are considered done and left alone.
+
+    Crashes are detected through the processes exit callbacks, ran as
+    soon as their child is reaped, and handed to the supervising loop
+    through a self-pipe: no process is ever polled.
+
+    A process crashing for the first time within period is restarted
+    right away, the following restarts are delayed by an exponential
+    backoff. If it crashes more than max_restarts times within period,
+    the supervisor gives up and stops every process.
+
+    :param  processes: processes to supervise
+    :type   processes: list of pkit.process.Process
+
+    :param  strategy: ONE_FOR_ONE only restarts the crashed process,
+                      ONE_FOR_ALL restarts every supervised process.
+    :type   strategy: str
+
+    :param  max_restarts: how many restarts of a single process are
+                          allowed within period
+    :type   max_restarts: int
+
+    :param  period: crash loop detection window, in seconds
+    :type   period: float
+
+    :param  backoff: delay before the second restart within period, in
+                     seconds, doubled on each following one.
+    :type   backoff: float
+
+    :param  max_backoff: upper bound of the restart delay, in seconds
+    :type   max_backoff: float
+    """
+    def __init__(self, processes=(), strategy=ONE_FOR_ONE, max_restarts=5,
+                 period=60, backoff=0.1, max_backoff=30):
+        if not strategy in STRATEGIES:
+            raise ValueError("Invalid supervision strategy supplied")
+
+        self.strategy = strategy
+        self.max_restarts = max_restarts
+        self.period = period
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.processes = []
+        self.restarts = 0
+        self.running = False
+        self.failed = False
+
+        self._restarts = {}
+        self._pending = []
+        self._exited = collections.deque()
+        self._stopping = set()
+
+        # Used by the exit callbacks to wake the loop up
+        self._wakeup = Wakeup()
+
+        for process in processes:
+            self.add(process)
+
+    def add(self, process):
+        """Puts a process under supervision
+
+        The process exit callback, if any, keeps being called.
+
+        :param  process: process to supervise
+        :type   process: pkit.process.Process
+        """
+        on_exit = process._on_exit
+
+        def supervised_on_exit(p):
+            if on_exit is not None:
+                on_exit(p)
+
+            self._exited.append((p, p.exitcode))
+            self._wakeup.notify()
+
+        process._on_exit = supervised_on_exit
+        self.processes.append(process)
+        self._restarts[process] = collections.deque()
+
+        if self.running is True and process.pid is None:
+            process.start()
+
+    def start(self):
+        """Starts every supervised process which is not running yet"""
+        self.running = True
+        self.failed = False
+        self._exited.clear()
+        self._stopping.clear()
+
+        for process in self.processes:
+            if process.pid is None:
+                process.start()
+
+    def stop(self):
+        """Stops supervising, and terminates every running process"""
+        self.running = False
+        self._pending = []
+
+        for process in self.processes:
+            self._terminate(process)
+
+    def run(self, timeout=None):
+        """Supervises the processes until stopped
+
+        :param  timeout: time to supervise for, forever if None
+        :type   timeout: float
+
+        :returns: False if the supervisor gave up on a crash loop
+        :rtype: bool
+        """
+        if self.running is False:
+            self.start()
+
+        deadline = time.time() + timeout if timeout is not None else None
+
+        while self.running is True:
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+
+            self.poll(remaining)
+
+        return not self.failed
+
+    def poll(self, timeout=0):
+        """Handles processes exits and due restarts
+
+        :param  timeout: time to wait for an exit if there is nothing
+                         to handle yet, forever if None.
+        :type   timeout: float
+        """
+        if self._pending:
+            due_in = max(self._pending[0][0] - time.time(), 0)
+            timeout = due_in if timeout is None else min(timeout, due_in)
+
+        self._wakeup.wait(timeout)
+
+        while self._exited:
+            process, exitcode = self._exited.popleft()
+
+            if process in self._stopping:
+                self._stopping.discard(process)
+            elif self.running is True and exitcode != 0:
+                self._on_crash(process)
+
+        now = time.time()
+        while self.running is True and self._pending and self._pending[0][0] <= now:
+            _, _, process = heapq.heappop(self._pending)
+            if process.pid is None:
+                process.start()
+
+    def _on_crash(self, process):
+        now = time.time()
+        restarts = self._restarts[process]
+
+        while restarts and restarts[0] <= now - self.period:
+            restarts.popleft()
+
+        if len(restarts) >= self.max_restarts:
+            self.failed = True
+            self.stop()
+            return
+
+        delay = 0
+        if restarts:
+            delay = min(self.backoff * 2 ** (len(restarts) - 1), self.max_backoff)
+
+        restarts.append(now)
+        self.restarts += 1
+
+        to_restart = [process]
+        if self.strategy == ONE_FOR_ALL:
+            to_restart = self.processes
+            for sibling in self.processes:
+                if sibling is not process:
+                    self._terminate(sibling)
+
+        for restarted in to_restart:
+            heapq.heappush(self._pending, (now + delay, id(restarted), restarted))
+
+    def _terminate(self, process):
+        if process.pid is not None:
+            self._stopping.add(process)
+            process.terminate(wait=True)
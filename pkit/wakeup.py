@@ -0,0 +1,78 @@
+import os
+import fcntl
+import errno
+import signal
+import select
+
+
+class Wakeup(object):
+    """Self-pipe waking an event loop up from signal handlers
+
+    Signal handlers, or other threads, notify the loop by writing to
+    the pipe, which the loop waits on instead of polling it's state.
+
+    A python signal handler only runs once the main thread returns from
+    the blocking call it is in: a signal landing right before the loop
+    blocks would only be handled once it wakes up for another reason.
+    While waiting from the main thread, the pipe is therefore installed
+    as the signal wakeup fd, written to by the C level handler.
+    """
+    def __init__(self):
+        self._read, self._write = os.pipe()
+
+        for fd in (self._read, self._write):
+            flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+            fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+    def fileno(self):
+        return self._read
+
+    def notify(self):
+        """Wakes the loop up, safe to call from a signal handler"""
+        try:
+            os.write(self._write, b'\0')
+        except OSError as e:
+            # A full pipe will wake the loop up all the same
+            if e.errno != errno.EAGAIN:
+                raise
+
+    def wait(self, timeout=None):
+        """Blocks until notified, or until timeout
+
+        :param  timeout: time to wait for, forever if None
+        :type   timeout: float
+
+        :returns: whether the loop was notified
+        :rtype: bool
+        """
+        # Signals are only handled by the main thread, waits from any
+        # other one cannot miss a notification.
+        try:
+            previous_wakeup_fd = signal.set_wakeup_fd(self._write)
+        except ValueError:
+            previous_wakeup_fd = None
+
+        try:
+            read, _, _ = select.select([self._read], [], [], timeout)
+        except select.error as e:
+            if e.args[0] == errno.EINTR:
+                return False
+            raise
+        finally:
+            if previous_wakeup_fd is not None:
+                signal.set_wakeup_fd(previous_wakeup_fd)
+
+        if not read:
+            return False
+
+        try:
+            os.read(self._read, 4096)
+        except OSError as e:
+            if e.errno != errno.EAGAIN:
+                raise
+
+        return True
+
+    def close(self):
+        os.close(self._read)
+        os.close(self._write)
@@ -19,6 +19,13 @@ class SlotPoolTest(unittest.TestCase):
         self.assertEqual(self.pool.size, 2)
         self.assertEqual(self.pool.free, 1)
 
+    def test_acquire_non_blocking_on_empty_pool(self):
+        self.assertTrue(self.pool.acquire(blocking=False))
+        self.assertTrue(self.pool.acquire(blocking=False))
+
+        self.assertFalse(self.pool.acquire(blocking=False))
+        self.assertEqual(self.pool.free, 0)
+
     def test_release(self):
         self.assertEqual(self.pool.size, 2)
         self.assertEqual(self.pool.free, 2)
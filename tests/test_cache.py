@@ -0,0 +1,114 @@
+import unittest
+
+import os
+import time
+import shutil
+import tempfile
+
+from pkit.cache import TaskCache, SqliteStore, task_key
+
+
+def dummy_target(*args, **kwargs):
+    pass
+
+
+def other_target(*args, **kwargs):
+    pass
+
+
+class TestTaskKey(unittest.TestCase):
+    def test_task_key_is_stable(self):
+        first = task_key(dummy_target, (1, 'abc'), {'b': 2, 'a': 1})
+        second = task_key(dummy_target, (1, 'abc'), {'a': 1, 'b': 2})
+
+        self.assertEqual(first, second)
+
+    def test_task_key_contains_target_qualified_name(self):
+        key = task_key(dummy_target, (1,))
+        self.assertTrue(key.startswith('{0}.dummy_target:'.format(__name__)))
+
+    def test_task_key_differs_with_arguments(self):
+        self.assertNotEqual(
+            task_key(dummy_target, (1,)),
+            task_key(dummy_target, (2,))
+        )
+        self.assertNotEqual(
+            task_key(dummy_target, (1,)),
+            task_key(other_target, (1,))
+        )
+
+    def test_task_key_with_anonymous_target_raises(self):
+        with self.assertRaises(ValueError):
+            task_key(lambda: None)
+
+
+class TestTaskCache(unittest.TestCase):
+    def test_get_returns_default_on_miss(self):
+        cache = TaskCache()
+
+        self.assertEqual(cache.get('abc'), None)
+        self.assertEqual(cache.get('abc', 123), 123)
+
+    def test_set_then_get(self):
+        cache = TaskCache()
+        cache.set('abc', 0)
+
+        self.assertEqual(cache.get('abc'), 0)
+        self.assertTrue('abc' in cache)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = TaskCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_expired_entries_are_dropped(self):
+        cache = TaskCache(ttl=0.05)
+        cache.set('abc', 0)
+        time.sleep(0.1)
+
+        self.assertEqual(cache.get('abc'), None)
+        self.assertEqual(len(cache), 0)
+
+    def test_invalid_maxsize_raises(self):
+        with self.assertRaises(ValueError):
+            TaskCache(maxsize=0)
+
+
+class TestSqliteStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_entries_survive_restarts(self):
+        store = SqliteStore(self.path)
+        TaskCache(store=store).set('abc', 0)
+        store.close()
+
+        cache = TaskCache(store=SqliteStore(self.path))
+        self.assertEqual(cache.get('abc'), 0)
+        self.assertEqual(len(cache), 1)
+
+    def test_evicted_entries_are_served_from_store(self):
+        cache = TaskCache(maxsize=1, store=SqliteStore(self.path))
+        cache.set('a', 1)
+        cache.set('b', 2)
+
+        self.assertEqual(cache.get('a'), 1)
+
+    def test_delete_removes_stored_entry(self):
+        store = SqliteStore(self.path)
+        cache = TaskCache(store=store)
+        cache.set('abc', 0)
+        cache.delete('abc')
+
+        self.assertEqual(store.get('abc'), None)
@@ -0,0 +1,89 @@
+import unittest
+
+import os
+import time
+import tempfile
+import shutil
+
+from pkit.pool import ProcessPool, Task
+from pkit.graph import TaskGraph
+
+
+def touch(directory, name):
+    open(os.path.join(directory, name), 'w').close()
+
+
+def touch_after(directory, name, dependencies):
+    for dependency in dependencies:
+        if not os.path.exists(os.path.join(directory, dependency)):
+            os._exit(2)
+    touch(directory, name)
+
+
+def fail():
+    os._exit(1)
+
+
+class TestTaskGraph(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_tasks_run_after_their_dependencies(self):
+        graph = TaskGraph(ProcessPool(4))
+        a = graph.add(touch, args=(self.directory, 'a'))
+        b = graph.add(touch, args=(self.directory, 'b'))
+        c = graph.add(touch_after, args=(self.directory, 'c', ['a', 'b']),
+                      depends_on=[a, b])
+
+        summary = graph.run(timeout=5)
+
+        self.assertEqual(summary, {a.id: 0, b.id: 0, c.id: 0})
+        self.assertEqual(c.status, Task.FINISHED)
+
+    def test_independent_branches_run_in_parallel(self):
+        graph = TaskGraph(ProcessPool(3))
+        tasks = [graph.add(time.sleep, args=(0.2,)) for _ in range(3)]
+
+        start = time.time()
+        graph.run(timeout=5)
+
+        self.assertTrue(time.time() - start < 0.5)
+        for task in tasks:
+            self.assertEqual(task.exitcode, 0)
+
+    def test_failure_cancels_downstream_tasks(self):
+        graph = TaskGraph(ProcessPool(2))
+        failing = graph.add(fail)
+        child = graph.add(touch, args=(self.directory, 'child'), depends_on=[failing])
+        grandchild = graph.add(touch, args=(self.directory, 'grandchild'), depends_on=[child])
+        sibling = graph.add(touch, args=(self.directory, 'sibling'))
+
+        summary = graph.run(timeout=5)
+
+        self.assertEqual(summary[failing.id], 1)
+        self.assertEqual(summary[sibling.id], 0)
+        self.assertTrue(child.cancelled)
+        self.assertTrue(grandchild.cancelled)
+        self.assertEqual(summary[grandchild.id], None)
+        self.assertFalse(os.path.exists(os.path.join(self.directory, 'child')))
+
+    def test_critical_path_is_dispatched_first(self):
+        graph = TaskGraph(ProcessPool(1))
+        short = graph.add(touch, args=(self.directory, 'short'))
+        head = graph.add(touch, args=(self.directory, 'head'))
+        tail = graph.add(touch_after, args=(self.directory, 'tail', ['head']),
+                         depends_on=[head], cost=5)
+
+        self.assertEqual(graph.critical_path(), [head, tail])
+
+        graph.run(timeout=5)
+        self.assertTrue(head.started_at < short.started_at)
+
+    def test_unknown_dependency_raises(self):
+        graph = TaskGraph(ProcessPool(1))
+
+        with self.assertRaises(ValueError):
+            graph.add(fail, depends_on=[Task(None)])
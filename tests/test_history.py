@@ -0,0 +1,64 @@
+import unittest
+
+import resource
+
+from pkit.history import TaskHistory, TaskRecord
+from pkit.pool import Task
+
+
+def finished_task(exitcode=0, rusage=None):
+    task = Task(1234)
+    task.finish()
+    task.exitcode = exitcode
+    task.started_at = 10.0
+    task.finished_at = 12.5
+    task.rusage = rusage
+    return task
+
+
+class TestTaskHistory(unittest.TestCase):
+    def test_record_then_get(self):
+        history = TaskHistory(maxlen=4)
+        task = finished_task(rusage=resource.getrusage(resource.RUSAGE_SELF))
+        history.record(task)
+
+        record = history.get(task.id)
+        self.assertTrue(isinstance(record, TaskRecord))
+        self.assertEqual(record.id, task.id)
+        self.assertEqual(record.exitcode, 0)
+        self.assertEqual(record.started_at, 10.0)
+        self.assertEqual(record.finished_at, 12.5)
+        self.assertEqual(record.maxrss, task.rusage.ru_maxrss)
+
+    def test_unknown_values_are_none(self):
+        history = TaskHistory(maxlen=4)
+        task = finished_task(exitcode=None)
+        history.record(task)
+
+        record = history.get(task.id)
+        self.assertEqual(record.exitcode, None)
+        self.assertEqual(record.utime, None)
+        self.assertEqual(record.maxrss, None)
+
+    def test_oldest_records_are_overwritten(self):
+        history = TaskHistory(maxlen=2)
+        tasks = [finished_task(exitcode) for exitcode in range(3)]
+        for task in tasks:
+            history.record(task)
+
+        self.assertEqual(len(history), 2)
+        self.assertEqual(history.get(tasks[0].id), None)
+        self.assertEqual([r.exitcode for r in history], [1, 2])
+
+    def test_clear(self):
+        history = TaskHistory(maxlen=2)
+        task = finished_task()
+        history.record(task)
+        history.clear()
+
+        self.assertEqual(len(history), 0)
+        self.assertEqual(history.get(task.id), None)
+
+    def test_invalid_maxlen_raises(self):
+        with self.assertRaises(ValueError):
+            TaskHistory(maxlen=0)
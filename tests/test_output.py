@@ -0,0 +1,65 @@
+import unittest
+
+import os
+
+from pkit.output import OutputStream, OutputReader, get_output_reader
+
+
+class TestOutputStream(unittest.TestCase):
+    def test_feed_splits_lines(self):
+        stream = OutputStream('stdout')
+        stream.feed(b'abc\n123\nde')
+
+        self.assertEqual(list(stream.lines), [b'abc', b'123'])
+
+        stream.feed(b'f\n')
+        self.assertEqual(list(stream.lines), [b'abc', b'123', b'def'])
+
+    def test_lines_are_bounded(self):
+        stream = OutputStream('stdout', maxlines=2)
+        stream.feed(b'a\nb\nc\n')
+
+        self.assertEqual(list(stream.lines), [b'b', b'c'])
+
+    def test_overlong_partial_line_is_flushed(self):
+        stream = OutputStream('stdout')
+        stream.feed(b'a' * (OutputStream.MAX_LINE_LENGTH + 1))
+
+        self.assertEqual(len(stream.lines), 1)
+
+    def test_close_flushes_partial_line(self):
+        stream = OutputStream('stdout')
+        stream.feed(b'abc')
+        stream.close()
+
+        self.assertEqual(list(stream.lines), [b'abc'])
+        self.assertTrue(stream.closed)
+
+    def test_callback_is_called_with_every_line(self):
+        lines = []
+        stream = OutputStream('stdout', callback=lines.append)
+        stream.feed(b'abc\n123\n')
+
+        self.assertEqual(lines, [b'abc', b'123'])
+
+
+class TestOutputReader(unittest.TestCase):
+    def test_get_output_reader_returns_a_process_wide_reader(self):
+        self.assertTrue(get_output_reader() is get_output_reader())
+
+    def test_register_drains_pipes_until_eof(self):
+        reader = OutputReader()
+        streams = []
+
+        for index in range(3):
+            read_pipe, write_pipe = os.pipe()
+            streams.append(reader.register(read_pipe, OutputStream('stdout')))
+            os.write(write_pipe, 'line {0}\n'.format(index).encode('UTF-8'))
+            os.close(write_pipe)
+
+        for index, stream in enumerate(streams):
+            self.assertTrue(stream.wait(1))
+            self.assertEqual(
+                list(stream.lines),
+                ['line {0}'.format(index).encode('UTF-8')]
+            )
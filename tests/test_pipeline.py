@@ -0,0 +1,91 @@
+import unittest
+
+import os
+import time
+
+try:
+    from queue import Full
+except ImportError:
+    from Queue import Full
+
+from pkit.pipeline import Pipeline, Stage, EndOfStream
+
+
+def double(record):
+    return record * 2
+
+
+def keep_multiples_of_four(record):
+    if record % 4 == 0:
+        return record
+
+
+def split(record):
+    for _ in range(record):
+        yield record
+
+
+def crash(record):
+    os._exit(1)
+
+
+def block(record):
+    time.sleep(10)
+
+
+class TestPipeline(unittest.TestCase):
+    def test_records_go_through_every_stage(self):
+        pipeline = Pipeline([
+            Stage(double, workers=2),
+            Stage(keep_multiples_of_four, workers=3),
+        ])
+        pipeline.start()
+
+        for record in range(10):
+            pipeline.put(record)
+        pipeline.close()
+
+        self.assertEqual(sorted(pipeline), [0, 4, 8, 12, 16])
+        self.assertTrue(pipeline.join(timeout=2))
+
+        stats = pipeline.stats()
+        self.assertEqual([s['processed'] for s in stats], [10, 10])
+        self.assertEqual([s['workers'] for s in stats], [2, 3])
+        self.assertEqual([s['queue_depth'] for s in stats], [0, 0])
+        self.assertTrue(stats[0]['throughput'] > 0)
+
+    def test_generator_stages_pass_every_yielded_record(self):
+        pipeline = Pipeline([Stage(split)])
+        pipeline.start()
+
+        pipeline.put(3)
+        pipeline.close()
+
+        self.assertEqual(list(pipeline), [3, 3, 3])
+        self.assertTrue(isinstance(pipeline.get(), EndOfStream))
+        self.assertTrue(pipeline.join(timeout=2))
+
+    def test_full_channels_block_the_input(self):
+        pipeline = Pipeline([Stage(block)], maxsize=1)
+        pipeline.start()
+
+        with self.assertRaises(Full):
+            for record in range(3):
+                pipeline.put(record, timeout=0.2)
+
+        pipeline.terminate()
+        self.assertTrue(pipeline.join(timeout=2))
+
+    def test_crashed_workers_are_reported(self):
+        pipeline = Pipeline([Stage(crash)])
+        pipeline.start()
+        pipeline.put(1)
+
+        with self.assertRaises(RuntimeError):
+            pipeline.get(timeout=2)
+
+        self.assertTrue(pipeline.join(timeout=2))
+
+    def test_empty_pipeline_raises(self):
+        with self.assertRaises(ValueError):
+            Pipeline([])
@@ -1,9 +1,32 @@
 import unittest
+import os
 import time
+import signal
+import psutil
 import multiprocessing as mp
 
 from pkit.process import Process
 from pkit.pool import ProcessPool, Task
+from pkit.history import TaskHistory
+
+
+def ignore_sigterm_and_sleep(duration):
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    time.sleep(duration)
+
+
+def spawn_child_and_sleep(queue, duration):
+    if os.fork() == 0:
+        time.sleep(duration)
+        os._exit(0)
+
+    queue.put(os.getpid())
+    time.sleep(duration)
+
+
+def allocate_and_sleep(size, duration):
+    data = 'a' * size
+    time.sleep(duration)
 
 
 class TestTask(unittest.TestCase):
@@ -23,6 +46,18 @@ class TestTask(unittest.TestCase):
 
         self.assertEqual(t.status, Task.FINISHED)
 
+    def test_task_ids_are_increasing_integers(self):
+        first, second = Task(1234), Task(1235)
+
+        self.assertTrue(isinstance(first.id, int))
+        self.assertTrue(second.id > first.id)
+
+    def test_task_has_no_instance_dict(self):
+        t = Task(1234)
+
+        with self.assertRaises(AttributeError):
+            t.abc = 123
+
 
 class TestProcessPool(unittest.TestCase):
     def test_execute_acquires_and_releases_slot(self):
@@ -34,7 +69,7 @@ class TestProcessPool(unittest.TestCase):
         pp.execute(target=lambda q: q.get(), args=(queue,))
         self.assertEqual(pp.slots.free, 0)
         queue.put('abc')
-        time.sleep(0.1)  # Let some time for the on_exit callback execution
+        self.assertTrue(pp.run(timeout=2))
         self.assertEqual(pp.slots.free, 1)
 
     def test_execute_keeps_tasks_store_up_to_date(self):
@@ -44,7 +79,7 @@ class TestProcessPool(unittest.TestCase):
         pp.execute(target=lambda q: q.get(), args=(queue,))
         self.assertEqual(len(pp._tasks), 1)
         queue.put('abc')
-        time.sleep(0.1)  # Let some time for the on_exit callback execution
+        self.assertTrue(pp.run(timeout=2))
         self.assertEqual(len(pp._tasks), 0)
 
     def test_execute_creates_an_up_to_date_task(self):
@@ -56,20 +91,188 @@ class TestProcessPool(unittest.TestCase):
         self.assertEqual(task.status, Task.RUNNING)
 
         queue.put('abc')
+        self.assertTrue(pp.run(timeout=2))
+        self.assertEqual(task.status, Task.FINISHED)
+
+    def test_execute_reaps_concurrent_tasks_exits(self):
+        pp = ProcessPool(3)
+
+        tasks = [pp.execute(target=time.sleep, args=(duration,))
+                 for duration in (0.3, 0.05, 0.15)]
+        self.assertTrue(pp.run(timeout=2))
+
+        self.assertEqual(len(pp._tasks), 0)
+        self.assertEqual(pp.slots.free, 3)
+        for task in tasks:
+            self.assertEqual(task.status, Task.FINISHED)
+            self.assertEqual(task.exitcode, 0)
+
+    def test_task_result_is_sent_back(self):
+        pp = ProcessPool(2)
+        task = pp.execute(target=lambda n: list(range(n)), args=(100000,))
+
+        self.assertEqual(task.result(timeout=2), list(range(100000)))
+        self.assertTrue(pp.run(timeout=2))
+        self.assertEqual(task.exitcode, 0)
+
+    def test_task_result_with_per_task_codec(self):
+        pp = ProcessPool(1)
+        task = pp.execute(target=lambda: b'abc', codec='raw')
+
+        self.assertEqual(task.result(timeout=2).tobytes(), b'abc')
+
+    def test_failed_task_result_is_none(self):
+        pp = ProcessPool(1)
+        task = pp.execute(target=lambda: os._exit(1))
+
+        self.assertEqual(task.result(timeout=2), None)
+
+    def test_exits_are_only_handled_by_the_event_loop(self):
+        pp = ProcessPool(2)
+        task = pp.execute(target=time.sleep, args=(0,))
+
+        # Let the child exit and be reaped by the SIGCHLD handler
         time.sleep(0.1)
+        self.assertEqual(task.status, Task.RUNNING)
+        self.assertEqual(pp.slots.free, 1)
+
+        self.assertEqual(pp.poll_events(timeout=1), 1)
         self.assertEqual(task.status, Task.FINISHED)
+        self.assertEqual(pp.slots.free, 2)
+
+    def test_poll_events_returns_on_timeout(self):
+        pp = ProcessPool(1)
+        pp.execute(target=time.sleep, args=(10,))
+
+        start = time.time()
+        self.assertEqual(pp.poll_events(timeout=0.1), 0)
+        self.assertTrue(time.time() - start < 0.5)
+
+        pp.terminate(wait=True)
+
+    def test_finished_tasks_are_recorded_in_history(self):
+        pp = ProcessPool(2, history=TaskHistory(maxlen=1))
+
+        tasks = [pp.execute(target=time.sleep, args=(0.05,))
+                 for _ in range(2)]
+        pp.close(timeout=2)
+
+        self.assertEqual(len(pp.history), 1)
+        record = pp.history.get(tasks[-1].id) or pp.history.get(tasks[0].id)
+        self.assertEqual(record.exitcode, 0)
+        self.assertTrue(record.finished_at >= record.started_at)
+        self.assertTrue(record.maxrss > 0)
+
+        for task in tasks:
+            self.assertTrue(task.rusage is not None)
+            self.assertTrue(task._process is None)
+
+    def test_execute_blocks_until_a_slot_is_freed(self):
+        pp = ProcessPool(1)
+
+        first = pp.execute(target=time.sleep, args=(0.1,))
+        second = pp.execute(target=time.sleep, args=(0,))
+
+        self.assertEqual(first.status, Task.FINISHED)
+        self.assertTrue(second is not None)
+
+    def test_execute_with_cache_coalesces_running_duplicates(self):
+        pp = ProcessPool(2)
 
-# Will be reactivated once the process.join will be fixed
-#    def test_close_joins_running_tasks(self):
-#        queue = mp.Queue()
-#        pp = ProcessPool(1)
-#
-#        task = pp.execute(target=lambda q: q.get(), args=(queue,))
-#        self.assertEqual(pp.slots.free, 0)
-#        queue.put('abc')
-#        pp.close()
-#
-#        self.assertEqual(pp.slots.free, 1)
+        first = pp.execute(target=time.sleep, args=(0.1,), cache=True)
+        second = pp.execute(target=time.sleep, args=(0.1,), cache=True)
+
+        self.assertTrue(first is second)
+        self.assertEqual(len(pp._tasks), 1)
+        self.assertEqual(pp.slots.free, 1)
+
+    def test_execute_with_cache_serves_finished_tasks(self):
+        pp = ProcessPool(1)
+
+        first = pp.execute(target=time.sleep, args=(0,), cache=True)
+        self.assertTrue(pp.run(timeout=1))
+
+        second = pp.execute(target=time.sleep, args=(0,), cache=True)
+        self.assertTrue(second is not first)
+        self.assertEqual(second.status, Task.FINISHED)
+        self.assertEqual(second.exitcode, 0)
+        self.assertEqual(len(pp._tasks), 0)
+
+    def test_close_joins_running_tasks(self):
+        queue = mp.Queue()
+        pp = ProcessPool(1)
+
+        task = pp.execute(target=lambda q: q.get(), args=(queue,))
+        self.assertEqual(pp.slots.free, 0)
+        queue.put('abc')
+        summary = pp.close()
+
+        self.assertEqual(pp.slots.free, 1)
+        self.assertEqual(summary, {task.id: 0})
+
+    def test_close_waits_against_a_single_deadline(self):
+        pp = ProcessPool(4)
+        tasks = [pp.execute(target=time.sleep, args=(10,)) for _ in range(4)]
+
+        before = time.time()
+        summary = pp.close(timeout=0.2)
+        self.assertTrue(time.time() - before < 0.5)
+        self.assertEqual(summary, dict((task.id, None) for task in tasks))
+
+        pp.terminate(wait=True)
+        self.assertEqual(len(pp._tasks), 0)
+
+    def test_terminate_escalates_to_sigkill_after_grace(self):
+        pp = ProcessPool(2)
+        stubborn = pp.execute(target=ignore_sigterm_and_sleep, args=(10,))
+        polite = pp.execute(target=time.sleep, args=(10,))
+        time.sleep(0.1)  # Let the target override the SIGTERM handler
+
+        before = time.time()
+        summary = pp.terminate(wait=True, grace=0.2)
+        self.assertTrue(time.time() - before < 0.6)
+
+        self.assertEqual(summary[polite.id], 1)
+        self.assertEqual(summary[stubborn.id], -signal.SIGKILL)
+        self.assertEqual(len(pp._tasks), 0)
+        self.assertEqual(pp.slots.free, 2)
+
+    def test_timed_out_tasks_are_terminated(self):
+        pp = ProcessPool(2)
+        slow = pp.execute(target=time.sleep, args=(10,), timeout=0.1)
+        fast = pp.execute(target=time.sleep, args=(0.05,), timeout=5)
+
+        summary = pp.close(timeout=2)
+
+        self.assertEqual(summary[slow.id], 1)
+        self.assertTrue(slow.timed_out)
+        self.assertEqual(summary[fast.id], 0)
+        self.assertFalse(fast.timed_out)
+
+    def test_timed_out_tasks_ignoring_sigterm_are_killed(self):
+        pp = ProcessPool(1, timeout_grace=0.1)
+        stubborn = pp.execute(
+            target=ignore_sigterm_and_sleep,
+            args=(10,),
+            timeout=0.1
+        )
+
+        # Waiting for the slot enforces the timeout
+        start = time.time()
+        pp.execute(target=time.sleep, args=(0,))
+        self.assertTrue(time.time() - start < 1)
+
+        self.assertEqual(stubborn.status, Task.FINISHED)
+        self.assertEqual(stubborn.exitcode, -signal.SIGKILL)
+        pp.close(timeout=2)
+
+    def test_check_timeouts_returns_expired_tasks(self):
+        pp = ProcessPool(1)
+        task = pp.execute(target=time.sleep, args=(10,), timeout=0)
+
+        self.assertEqual(pp.check_timeouts(), [task])
+        self.assertEqual(pp.check_timeouts(), [])
+        pp.terminate(wait=True)
 
     def test_terminate_kills_running_tasks(self):
         queue = mp.Queue()
@@ -83,17 +286,116 @@ class TestProcessPool(unittest.TestCase):
         self.assertEqual(len(pp._tasks), 0)
         self.assertEqual(pp.slots.free, 1)
 
+    def test_process_group_is_shared_by_the_pool_tasks(self):
+        pp = ProcessPool(2, process_group=True)
+        pp.execute(target=time.sleep, args=(10,))
+        pp.execute(target=time.sleep, args=(10,))
+
+        pgids = set(os.getpgid(pid) for pid in pp._tasks)
+        self.assertEqual(pgids, set([pp.pgid]))
+        self.assertNotEqual(pp.pgid, os.getpgrp())
+
+        pp.terminate(wait=True)
+        self.assertEqual(len(pp._tasks), 0)
+
+    def test_terminate_stops_tasks_descendants(self):
+        queue = mp.Queue()
+        pp = ProcessPool(1, process_group=True)
+        pp.execute(target=spawn_child_and_sleep, args=(queue, 10))
+
+        task_pid = queue.get(timeout=1)
+        grandchildren = psutil.Process(task_pid).children()
+        self.assertEqual(len(grandchildren), 1)
+
+        pp.terminate(wait=True)
+        time.sleep(0.1)
+
+        try:
+            status = grandchildren[0].status()
+        except psutil.NoSuchProcess:
+            status = psutil.STATUS_DEAD
+        self.assertTrue(status in (psutil.STATUS_DEAD, psutil.STATUS_ZOMBIE))
+
+    def test_pause_and_resume_tasks(self):
+        pp = ProcessPool(2, process_group=True)
+        pp.execute(target=time.sleep, args=(10,))
+        pp.execute(target=time.sleep, args=(10,))
+
+        def statuses():
+            return set(psutil.Process(pid).status() for pid in pp._tasks)
+
+        pp.pause()
+        deadline = time.time() + 1
+        while statuses() != set([psutil.STATUS_STOPPED]) and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(statuses(), set([psutil.STATUS_STOPPED]))
+
+        pp.resume()
+        deadline = time.time() + 1
+        while psutil.STATUS_STOPPED in statuses() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(psutil.STATUS_STOPPED in statuses())
+
+        pp.terminate(wait=True)
+
+    def test_recycle_replaces_tasks_over_max_rss(self):
+        pp = ProcessPool(2, max_rss_per_worker=64 * 1024 * 1024)
+        leaking = pp.execute(target=allocate_and_sleep, args=(128 * 1024 * 1024, 10))
+        sober = pp.execute(target=time.sleep, args=(10,))
+        # Let the target allocate it's memory
+        deadline = time.time() + 2
+        while time.time() < deadline:
+            rss = leaking._process.rss
+            if rss is not None and rss > pp.max_rss_per_worker:
+                break
+            time.sleep(0.01)
+
+        pids = dict((task, pid) for pid, task in pp._tasks.items())
+        recycled = pp.recycle()
+        self.assertEqual(recycled, [leaking])
+
+        new_pids = dict((task, pid) for pid, task in pp._tasks.items())
+        self.assertEqual(new_pids[sober], pids[sober])
+        self.assertNotEqual(new_pids[leaking], pids[leaking])
+        self.assertEqual(leaking.status, Task.RUNNING)
+
+        def retired():
+            try:
+                return psutil.Process(pids[leaking]).status() == psutil.STATUS_ZOMBIE
+            except psutil.NoSuchProcess:
+                return True
+
+        deadline = time.time() + 1
+        while not retired() and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(retired())
+        self.assertEqual(pp.slots.free, 0)
+
+        pp.terminate(wait=True)
+        self.assertEqual(pp.slots.free, 2)
+
+    def test_recycle_without_max_rss_is_a_noop(self):
+        pp = ProcessPool(1)
+        pp.execute(target=time.sleep, args=(10,))
+
+        self.assertEqual(pp.recycle(), [])
+
+        pp.terminate(wait=True)
+
+    def test_recycle_raises_with_invalid_policy(self):
+        pp = ProcessPool(1)
+
+        with self.assertRaises(ValueError):
+            pp.recycle(policy="that's definetly invalid")
+
     def test_on_process_exit_cleanups_the_tasks_store(self):
         pp = ProcessPool(1)
         pp.slots.acquire()
         self.assertEqual(pp.slots.free, 0)
 
         task = Task(1234)
-        process = Process()
-        pp._tasks[1234] = {
-            'task': task,
-            'process': process,
-        }
+        task._process = Process()
+        pp._tasks[1234] = task
 
         pp.on_process_exit(1234)
         self.assertEqual(pp.slots.free, 1)
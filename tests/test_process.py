@@ -6,7 +6,7 @@ import select
 import signal
 import psutil
 
-from pkit.process import ProcessOpen, Process, get_current_process
+from pkit.process import ProcessOpen, Process, get_current_process, start_many
 
 
 class TestGetCurrentProcess(unittest.TestCase):
@@ -384,3 +384,135 @@ class TestProcess(unittest.TestCase):
     def test_restart_raises_with_invalid_policy(self):
         with self.assertRaises(ValueError):
             self.process.restart("that's definetly invalid")
+
+    def test_restart_with_terminate_policy(self):
+        from pkit.process import TERMINATE_RESTART_POLICY
+
+        process = Process(target=lambda: time.sleep(10))
+        pid_dump = process.start(wait=True)
+
+        process.restart(TERMINATE_RESTART_POLICY)
+        self.assertTrue(process.is_alive)
+        self.assertNotEqual(process.pid, pid_dump)
+        self.assertFalse(psutil.pid_exists(pid_dump))
+
+        process.terminate(wait=True)
+
+    def test_capture_output_collects_child_lines(self):
+        def target():
+            os.write(1, b'abc\n123\n')
+            os.write(2, b'error\n')
+
+        process = Process(target=target, capture_output=True)
+        process.start()
+
+        self.assertTrue(process.stdout.wait(1))
+        self.assertTrue(process.stderr.wait(1))
+        self.assertEqual(list(process.stdout.lines), [b'abc', b'123'])
+        self.assertEqual(list(process.stderr.lines), [b'error'])
+
+    def test_capture_output_calls_on_output_with_every_line(self):
+        captured = []
+        process = Process(
+            target=lambda: os.write(1, b'abc\n'),
+            capture_output=True,
+            on_output=lambda p, name, line: captured.append((p, name, line)),
+        )
+        process.start()
+        process.stdout.wait(1)
+
+        self.assertEqual(captured, [(process, 'stdout', b'abc')])
+
+    def test_output_is_not_captured_by_default(self):
+        process = Process(target=lambda: None)
+        process.start()
+
+        self.assertTrue(process.stdout is None)
+        self.assertTrue(process.stderr is None)
+
+    def test_process_group_zero_makes_child_lead_a_new_group(self):
+        process = Process(target=lambda: time.sleep(10), process_group=0)
+        pid = process.start(wait=True)
+
+        self.assertEqual(process.pgid, pid)
+        self.assertEqual(os.getpgid(pid), pid)
+        self.assertNotEqual(os.getpgid(pid), os.getpgrp())
+
+        process.terminate(wait=True)
+
+    def test_process_group_joins_an_existing_group(self):
+        leader = Process(target=lambda: time.sleep(10), process_group=0)
+        leader_pid = leader.start(wait=True)
+
+        member = Process(target=lambda: time.sleep(10), process_group=leader_pid)
+        member_pid = member.start(wait=True)
+
+        self.assertEqual(member.pgid, leader_pid)
+        self.assertEqual(os.getpgid(member_pid), leader_pid)
+
+        leader.terminate(wait=True)
+        member.terminate(wait=True)
+
+    def test_process_group_is_inherited_by_default(self):
+        process = Process(target=lambda: time.sleep(10))
+        pid = process.start(wait=True)
+
+        self.assertEqual(process.pgid, None)
+        self.assertEqual(os.getpgid(pid), os.getpgrp())
+
+        process.terminate(wait=True)
+
+    def test_rss_is_none_when_not_started(self):
+        self.assertEqual(self.process.rss, None)
+
+    def test_rss_of_running_process(self):
+        process = Process(target=lambda: time.sleep(10))
+        process.start(wait=True)
+        rss = process.rss
+        psutil_rss = psutil.Process(process.pid).memory_info().rss
+        process.terminate(wait=True)
+
+        self.assertTrue(rss > 0)
+        self.assertTrue(0.5 < float(rss) / psutil_rss < 2)
+
+    def test_rusage_of_exited_process(self):
+        process = Process(target=lambda: time.sleep(10))
+        self.assertEqual(process.rusage, None)
+
+        process.start(wait=True)
+        process.terminate(wait=True)
+
+        self.assertTrue(process.rusage is not None)
+        self.assertTrue(process.rusage.ru_maxrss > 0)
+
+
+class TestStartMany(unittest.TestCase):
+    def test_start_many_waits_for_every_child(self):
+        processes = [Process(target=lambda: time.sleep(10)) for _ in range(20)]
+        pids = start_many(processes, wait=True, wait_timeout=5)
+
+        self.assertEqual(pids, [process.pid for process in processes])
+        for process in processes:
+            self.assertTrue(process._child.ready)
+            self.assertTrue(process.is_alive)
+
+        for process in processes:
+            process.terminate(wait=True)
+
+    def test_start_many_without_wait(self):
+        processes = [Process(target=lambda: time.sleep(10)) for _ in range(3)]
+        start_many(processes)
+
+        for process in processes:
+            self.assertEqual(process._child.ready, None)
+            process.terminate(wait=True)
+
+    def test_start_many_does_not_leak_file_descriptors(self):
+        fds = len(os.listdir('/proc/self/fd'))
+        processes = [Process(target=lambda: time.sleep(10)) for _ in range(3)]
+        start_many(processes, wait=True)
+
+        self.assertEqual(len(os.listdir('/proc/self/fd')), fds)
+
+        for process in processes:
+            process.terminate(wait=True)
@@ -0,0 +1,84 @@
+import unittest
+
+import os
+import pickle
+
+from pkit.serialization import (
+    PickleCodec, MsgpackCodec, RawCodec, MessageStream, get_codec,
+    encode_message, decode_message, write_message, msgpack
+)
+
+
+def roundtrip(codec, obj):
+    data = bytearray(b''.join(
+        memoryview(chunk).tobytes() for chunk in encode_message(codec, obj)
+    ))
+    return decode_message(codec, data)
+
+
+class TestCodecs(unittest.TestCase):
+    def test_pickle_roundtrip(self):
+        obj = {'a': [1, 2, 3], 'b': (u'abc', 1.5)}
+        self.assertEqual(roundtrip(PickleCodec(), obj), obj)
+
+    def test_pickle_with_older_protocol(self):
+        self.assertEqual(roundtrip(PickleCodec(protocol=2), [1, 2]), [1, 2])
+
+    @unittest.skipIf(pickle.HIGHEST_PROTOCOL < 5, "requires pickle protocol 5")
+    def test_pickle_buffers_are_sent_out_of_band(self):
+        data = bytearray(b'a' * 1024)
+        payload, buffers = PickleCodec().encode(pickle.PickleBuffer(data))
+
+        self.assertTrue(len(payload) < 1024)
+        self.assertEqual(len(buffers), 1)
+        self.assertEqual(
+            roundtrip(PickleCodec(), pickle.PickleBuffer(data)).tobytes(),
+            bytes(data)
+        )
+
+    def test_raw_roundtrip(self):
+        self.assertEqual(roundtrip(RawCodec(), b'abc').tobytes(), b'abc')
+
+    def test_raw_with_invalid_type_raises(self):
+        with self.assertRaises(TypeError):
+            RawCodec().encode(123)
+
+    @unittest.skipIf(msgpack is None, "requires msgpack")
+    def test_msgpack_roundtrip(self):
+        obj = {u'a': [1, 2, 3]}
+        self.assertEqual(roundtrip(MsgpackCodec(), obj), obj)
+
+    def test_get_codec(self):
+        codec = RawCodec()
+
+        self.assertTrue(isinstance(get_codec('pickle'), PickleCodec))
+        self.assertTrue(get_codec(codec) is codec)
+
+        with self.assertRaises(ValueError):
+            get_codec('abc')
+
+
+class TestMessageStream(unittest.TestCase):
+    def test_write_message_then_decode(self):
+        read_fd, write_fd = os.pipe()
+        codec = PickleCodec()
+        write_message(write_fd, codec, [1, 2, 3])
+        os.close(write_fd)
+
+        stream = MessageStream(codec)
+        data = os.read(read_fd, 4096)
+        while data:
+            stream.feed(data)
+            data = os.read(read_fd, 4096)
+        stream.close()
+        os.close(read_fd)
+
+        self.assertTrue(stream.wait(0))
+        self.assertEqual(stream.decode(), [1, 2, 3])
+
+    def test_empty_stream_decodes_to_none(self):
+        stream = MessageStream(PickleCodec())
+        stream.close()
+
+        self.assertTrue(stream.empty)
+        self.assertEqual(stream.decode(), None)
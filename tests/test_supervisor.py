@@ -0,0 +1,118 @@
+import unittest
+
+import os
+import time
+import multiprocessing as mp
+
+from pkit.process import Process
+from pkit.supervisor import Supervisor, ONE_FOR_ONE, ONE_FOR_ALL
+
+
+def crash_once_then_sleep(runs, duration):
+    with runs.get_lock():
+        runs.value += 1
+        first_run = runs.value == 1
+
+    if first_run:
+        os._exit(1)
+
+    time.sleep(duration)
+
+
+def crash():
+    os._exit(1)
+
+
+class TestSupervisor(unittest.TestCase):
+    def setUp(self):
+        self.supervisor = None
+
+    def tearDown(self):
+        if self.supervisor is not None:
+            self.supervisor.stop()
+
+    def test_invalid_strategy_raises(self):
+        with self.assertRaises(ValueError):
+            Supervisor(strategy="that's definetly invalid")
+
+    def test_crashed_process_is_restarted(self):
+        runs = mp.Value('i', 0)
+        process = Process(target=crash_once_then_sleep, args=(runs, 10))
+        self.supervisor = Supervisor([process])
+
+        self.supervisor.run(timeout=0.3)
+
+        self.assertEqual(runs.value, 2)
+        self.assertEqual(self.supervisor.restarts, 1)
+        self.assertTrue(process.is_alive)
+
+    def test_successful_process_is_not_restarted(self):
+        process = Process(target=lambda: None)
+        self.supervisor = Supervisor([process])
+
+        self.supervisor.run(timeout=0.3)
+
+        self.assertEqual(self.supervisor.restarts, 0)
+        self.assertEqual(process.pid, None)
+
+    def test_supervised_process_exit_callback_is_still_called(self):
+        exited = []
+        process = Process(target=crash, on_exit=lambda p: exited.append(p))
+        self.supervisor = Supervisor([process], max_restarts=1)
+
+        self.supervisor.run(timeout=1)
+
+        self.assertEqual(exited, [process, process])
+
+    def test_crash_loop_makes_supervisor_give_up(self):
+        process = Process(target=crash)
+        self.supervisor = Supervisor([process], max_restarts=3, backoff=0.05)
+
+        before = time.time()
+        result = self.supervisor.run(timeout=5)
+        elapsed = time.time() - before
+
+        self.assertFalse(result)
+        self.assertTrue(self.supervisor.failed)
+        self.assertFalse(self.supervisor.running)
+        self.assertEqual(self.supervisor.restarts, 3)
+        # First restart is immediate, the next ones are backed off
+        self.assertTrue(0.05 + 0.1 <= elapsed < 1)
+
+    def test_one_for_all_restarts_every_process(self):
+        runs = mp.Value('i', 0)
+        crashing = Process(target=crash_once_then_sleep, args=(runs, 10))
+        sibling = Process(target=lambda: time.sleep(10))
+        self.supervisor = Supervisor([sibling, crashing], strategy=ONE_FOR_ALL)
+
+        self.supervisor.start()
+        sibling_pid = sibling.pid
+        self.supervisor.run(timeout=0.5)
+
+        self.assertEqual(self.supervisor.restarts, 1)
+        self.assertTrue(sibling.is_alive)
+        self.assertNotEqual(sibling.pid, sibling_pid)
+        self.assertTrue(crashing.is_alive)
+
+    def test_one_for_one_leaves_siblings_alone(self):
+        runs = mp.Value('i', 0)
+        crashing = Process(target=crash_once_then_sleep, args=(runs, 10))
+        sibling = Process(target=lambda: time.sleep(10))
+        self.supervisor = Supervisor([sibling, crashing], strategy=ONE_FOR_ONE)
+
+        self.supervisor.start()
+        sibling_pid = sibling.pid
+        self.supervisor.run(timeout=0.3)
+
+        self.assertEqual(sibling.pid, sibling_pid)
+        self.assertTrue(crashing.is_alive)
+
+    def test_stop_terminates_processes(self):
+        process = Process(target=lambda: time.sleep(10))
+        self.supervisor = Supervisor([process])
+        self.supervisor.start()
+
+        self.supervisor.stop()
+
+        self.assertFalse(process.is_alive)
+        self.assertFalse(self.supervisor.running)